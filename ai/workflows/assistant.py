@@ -2,6 +2,7 @@
 
 from datetime import datetime, timedelta
 import json
+import logging
 from typing import List, Dict
 from zoneinfo import ZoneInfo
 from openai import AsyncOpenAI
@@ -34,8 +35,10 @@ from tools.task import (
     get_tasks_tool,
     update_task_status_tool,
     create_task,
+    create_tasks,
     get_tasks,
-    update_task_status
+    update_task_status,
+    PRIORITY_EMOJI
 )
 from tools.notes import (
     create_note_tool,
@@ -50,6 +53,8 @@ from db.mongo import users_collection
 
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 APP_URL = os.getenv("APP_URL")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
@@ -63,7 +68,7 @@ USER_LOCKS_CACHE_TTL = int(os.getenv("USER_LOCKS_CACHE_TTL", "600"))  # 10 minut
 conversation_cache = TTLCache(maxsize=CONVERSATION_CACHE_SIZE, ttl=CONVERSATION_CACHE_TTL)
 user_locks = TTLCache(maxsize=USER_LOCKS_CACHE_SIZE, ttl=USER_LOCKS_CACHE_TTL)
 
-print(f"🔧 Cache initialized: Conversation cache (size={CONVERSATION_CACHE_SIZE}, ttl={CONVERSATION_CACHE_TTL}s), User locks (size={USER_LOCKS_CACHE_SIZE}, ttl={USER_LOCKS_CACHE_TTL}s)")
+logger.info("Cache initialized: Conversation cache (size=%s, ttl=%ss), User locks (size=%s, ttl=%ss)", CONVERSATION_CACHE_SIZE, CONVERSATION_CACHE_TTL, USER_LOCKS_CACHE_SIZE, USER_LOCKS_CACHE_TTL)
 cache_lock = asyncio.Lock()  # Global lock for lock management
 
 async def get_cached_conversation_history(user_id: str) -> List[Dict]:
@@ -79,7 +84,7 @@ async def get_cached_conversation_history(user_id: str) -> List[Dict]:
     """
     # Try to get from cache first (fast path)
     if user_id in conversation_cache:
-        print(f"📋 Cache hit for user {user_id}")
+        logger.debug("Cache hit for user %s", user_id)
         return conversation_cache[user_id]
 
     # Cache miss - need to load from database with proper locking
@@ -93,11 +98,11 @@ async def get_cached_conversation_history(user_id: str) -> List[Dict]:
     async with user_lock:
         # Double-check: another coroutine might have populated the cache while we waited for the lock
         if user_id in conversation_cache:
-            print(f"📋 Cache hit for user {user_id} (after lock)")
+            logger.debug("Cache hit for user %s (after lock)", user_id)
             return conversation_cache[user_id]
 
         # Cache miss - load from database
-        print(f"💾 Cache miss for user {user_id} - loading from MongoDB")
+        logger.debug("Cache miss for user %s - loading from MongoDB", user_id)
         history = await get_conversation_history(user_id)
 
         # Store in cache for future requests (atomic operation)
@@ -125,10 +130,10 @@ async def clear_user_cache(user_id: str) -> bool:
         if user_id in user_locks:
             del user_locks[user_id]
 
-        print(f"🗑️ Cleared cache for user {user_id}")
+        logger.debug("Cleared cache for user %s", user_id)
         return True
     except Exception as e:
-        print(f"❌ Error clearing cache for user {user_id}: {e}")
+        logger.error("Error clearing cache for user %s: %s", user_id, e)
         return False
 
 def get_cache_stats() -> Dict:
@@ -175,7 +180,7 @@ async def warm_cache_for_active_users(limit: int = 100) -> Dict:
         Dictionary with warming statistics
     """
     try:
-        print(f"🔥 Starting cache warming for top {limit} active users...")
+        logger.info("Starting cache warming for top %s active users...", limit)
 
         # Find users with recent conversation activity, sorted by most recent
         pipeline = [
@@ -200,15 +205,15 @@ async def warm_cache_for_active_users(limit: int = 100) -> Dict:
                     history = user_doc.get("messages", [])
                     conversation_cache[user_id] = history
                     warmed_count += 1
-                    print(f"🔥 Warmed cache for user {user_id} ({len(history)} messages)")
+                    logger.debug("Warmed cache for user %s (%s messages)", user_id, len(history))
                 else:
-                    print(f"⏭️ User {user_id} already in cache, skipping")
+                    logger.debug("User %s already in cache, skipping", user_id)
             except Exception as e:
                 error_msg = f"Error warming cache for user {user_id}: {e}"
-                print(f"❌ {error_msg}")
+                logger.error("%s", error_msg)
                 errors.append(error_msg)
 
-        print(f"✅ Cache warming completed: {warmed_count}/{len(active_users)} users warmed")
+        logger.info("Cache warming completed: %s/%s users warmed", warmed_count, len(active_users))
 
         return {
             "warmed_users": warmed_count,
@@ -219,7 +224,7 @@ async def warm_cache_for_active_users(limit: int = 100) -> Dict:
 
     except Exception as e:
         error_msg = f"Cache warming failed: {e}"
-        print(f"❌ {error_msg}")
+        logger.error("%s", error_msg)
         return {
             "warmed_users": 0,
             "total_active_users": 0,
@@ -240,10 +245,10 @@ async def schedule_cache_warming(interval_minutes: int = 15) -> None:
             await asyncio.sleep(interval_minutes * 60)  # Convert to seconds
             await warm_cache_for_active_users()
         except asyncio.CancelledError:
-            print("🔥 Cache warming scheduler cancelled")
+            logger.info("Cache warming scheduler cancelled")
             break
         except Exception as e:
-            print(f"❌ Error in cache warming scheduler: {e}")
+            logger.error("Error in cache warming scheduler: %s", e)
             # Continue running even if there's an error
 
 tools = [
@@ -295,17 +300,17 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
         user = await users_collection.find_one({"hashed_phone_number": hashed_number})
         
         if not user:
-            print(f"❌ UNEXPECTED: User not found in assistant_response for sender: {sender}")
-            print(f"❌ Hashed number: {hashed_number}")
-            print(f"❌ This should not happen as main.py already checked user existence")
+            logger.error("UNEXPECTED: User not found in assistant_response for sender: %s", sender)
+            logger.error("Hashed number: %s", hashed_number)
+            logger.error("This should not happen as main.py already checked user existence")
             
             # Try one more time to rule out transient database issues
             user_retry = await users_collection.find_one({"hashed_phone_number": hashed_number})
             if user_retry:
-                print(f"✅ RETRY SUCCESS: User found on second attempt")
+                logger.info("RETRY SUCCESS: User found on second attempt")
                 user = user_retry
             else:
-                print(f"❌ RETRY FAILED: User still not found - potential database issue")
+                logger.error("RETRY FAILED: User still not found - potential database issue")
                 await send_whatsapp_message(phone_number, "❌ Temporary issue. Please try again in a moment.")
                 return {"ok": False, "error": "User not found after retry"}
         
@@ -317,7 +322,7 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
         user_id = str(user["_id"])
         user_input = text
 
-        print(f"Processing message from {user_id}: {user_input}")
+        logger.debug("Processing message from %s: %s", user_id, user_input)
 
         # Calculate current date/time fresh for each request with enhanced context
         now = datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
@@ -438,6 +443,24 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
                         result = await list_reminders(user_id=user_id)
                         reply = result["message"]
 
+                    elif function_name == "create_task" and sum(tc.name == "create_task" for tc in tool_calls) > 1:
+                        # Several tasks in one turn: insert them in a single round trip,
+                        # reusing this call's parsed args and parsing only the others
+                        task_args = [
+                            args if tc is tool_call else json.loads(tc.arguments)
+                            for tc in tool_calls if tc.name == "create_task"
+                        ]
+                        created = await create_tasks(task_args, user_id=user_id)
+                        task_lines = "\n".join(
+                            f"{PRIORITY_EMOJI.get(task['priority'], '🟢')} {task['title']}"
+                            for task in created
+                        )
+                        reply = (
+                            f"✅ {len(created)} Tasks Created\n\n"
+                            f"{task_lines}\n\n"
+                            f"🔗 Check in Dashboard: {FRONTEND_URL}/dashboard?phone_number={phone_number}"
+                        )
+
                     elif function_name == "create_task":
                         # Get the priority, defaulting to medium
                         task_priority = args.get("priority", "medium")
@@ -447,7 +470,7 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
                             description=args.get("description"),
                             user_id=user_id
                         )
-                        priority_emoji = "🔴" if task_priority == "high" else "🟡" if task_priority == "medium" else "🟢"
+                        priority_emoji = PRIORITY_EMOJI.get(task_priority, "🟢")
                         reply = (
                             f"✅ Task Created\n\n"
                             f"Title: {args['title']}\n"
@@ -466,17 +489,19 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
                         if not tasks:
                             reply = "📝 You have no tasks at the moment."
                         else:
-                            # Group tasks by status
-                            pending_tasks = [t for t in tasks if t.get("status") == "pending"]
-                            in_progress_tasks = [t for t in tasks if t.get("status") == "in_progress"]
-                            completed_tasks = [t for t in tasks if t.get("status") == "completed"]
+                            # Group tasks by status in a single pass
+                            buckets = {"pending": [], "in_progress": [], "completed": []}
+                            for t in tasks:
+                                bucket = buckets.get(t.get("status"))
+                                if bucket is not None:
+                                    bucket.append(t)
 
                             reply_lines = [""]
 
                             sections = [
-                                ("📋 Pending Tasks", pending_tasks),
-                                ("⚙️ In Progress Tasks", in_progress_tasks),
-                                ("✅ Completed Tasks", completed_tasks),
+                                ("📋 Pending Tasks", buckets["pending"]),
+                                ("⚙️ In Progress Tasks", buckets["in_progress"]),
+                                ("✅ Completed Tasks", buckets["completed"]),
                             ]
 
                             for section_title, section_tasks in sections:
@@ -630,7 +655,7 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
                         reply = "❌ Unknown function requested."
 
                 except AuthRequiredError:
-                    auth_url = get_auth_url(user_id)
+                    auth_url = await get_auth_url(user_id)
                     reply = (
                         f"🔐 Oops! It seems like you haven't given me access to your calendar yet. "
                         f"Please authorize access through this link:\n{auth_url}\n\n"
@@ -688,5 +713,5 @@ async def assistant_response(sender: str, text: str, playground_mode: bool = Fal
         return {"ok": True}
 
     except Exception as e:
-        print(f"Error in assistant_response: {e}")
+        logger.error("Error in assistant_response: %s", e)
         return {"ok": False, "error": str(e)}
\ No newline at end of file
@@ -1,22 +1,40 @@
 from pymongo import AsyncMongoClient
+from pymongo.errors import ExecutionTimeout, ServerSelectionTimeoutError
 import os
 import asyncio
-from datetime import datetime
+import logging
+import time
+from datetime import datetime, timezone
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 # Load environment variables first
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logger = logging.getLogger(__name__)
+
 MONGO_URI = os.getenv("MONGO_URI")
 MEMORY_MESSAGE_LIMIT = int(os.getenv("MEMORY_MESSAGE_LIMIT", "30"))
+# Unused OAuth states are purged after this long; keep it above AUTH_URL_CACHE_TTL in
+# utils.utils so a cached consent URL never outlives its state
+OAUTH_STATE_TTL = int(os.getenv("OAUTH_STATE_TTL", "1800"))  # 30 minutes default
+
+# Connection pool sizing (override per deployment via env)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "200"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))  # 5 minutes
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
 
 client = AsyncMongoClient(
     MONGO_URI,
     serverSelectionTimeoutMS=5000,
     socketTimeoutMS=30000,
     connectTimeoutMS=10000,
-    maxPoolSize=100,  # you can increase a bit for high concurrency
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,  # fail fast instead of queueing forever when the pool is exhausted
+    retryWrites=True,
 )
 
 db_name = os.environ.get("DB_NAME")
@@ -27,78 +45,96 @@ oauth_tokens_collection = db["oauth_tokens"]
 conversation_history_collection = db["conversation_history"]
 reminders_collection = db["reminders"]
 
+# Set once the unique users.hashed_phone_number index is confirmed; until then
+# create_user falls back to a find_one pre-check so duplicates are still rejected
+_users_phone_index_ready = False
+
+def users_phone_index_ready() -> bool:
+    """Whether the unique hashed_phone_number index exists, so signup can rely on it alone."""
+    return _users_phone_index_ready
+
 # Test connection and create index asynchronously
 async def init_mongodb():
+    global _users_phone_index_ready
     try:
         await client.admin.command('ping')
-        print("✅ MongoDB connection established successfully")
+        logger.info("MongoDB connection established successfully")
         
         # Create index on user_id for efficient querying
         await conversation_history_collection.create_index("user_id")
-        print("✅ Created index on user_id for conversation_history collection")
+        logger.info("Created index on user_id for conversation_history collection")
+    except Exception as e:
+        logger.error("MongoDB initialization failed: %s", e)
+        return
+    
+    try:
+        # One account per phone number; create_user relies on this to reject duplicates
+        await users_collection.create_index("hashed_phone_number", unique=True)
+        _users_phone_index_ready = True
+        logger.info("Created unique index on hashed_phone_number for users collection")
+    except Exception as e:
+        logger.error(
+            "Users index creation failed (duplicate phone numbers?); signup falls back "
+            "to a pre-check without race protection: %s", e
+        )
+
+    try:
+        # Abandoned OAuth flows would otherwise accumulate forever
+        await oauth_states_collection.create_index("created_at", expireAfterSeconds=OAUTH_STATE_TTL)
+        logger.info("Created TTL index on created_at for oauth_states collection")
     except Exception as e:
-        print(f"❌ MongoDB initialization failed: {e}")
+        logger.warning("OAuth states TTL index creation failed: %s", e)
+
+    try:
+        # get_auth_url and the Google callback upsert by user_id; unique also stops
+        # concurrent upserts from creating duplicate per-user documents
+        await oauth_states_collection.create_index("user_id", unique=True)
+        await oauth_tokens_collection.create_index("user_id", unique=True)
+        logger.info("Created unique indexes on user_id for oauth_states and oauth_tokens collections")
+    except Exception as e:
+        logger.warning("OAuth user_id index creation failed (duplicate user documents?): %s", e)
+
+    try:
+        # The Google callback resolves the user with find_one({"state": ...})
+        await oauth_states_collection.create_index("state")
+        logger.info("Created index on state for oauth_states collection")
+    except Exception as e:
+        logger.warning("OAuth state index creation failed: %s", e)
 
 # Initialize in the background - moved to FastAPI lifespan in main.py
 # asyncio.create_task(init_mongodb())
 
 async def get_all_users():
     """Get all users from the users collection"""
-    import time
-    from pymongo.errors import ExecutionTimeout, ServerSelectionTimeoutError
-    
     start_time = time.time()
     
     try:
-        print("[MONGO] Starting get_all_users query...")
+        logger.debug("[MONGO] Starting get_all_users query...")
         # Access the users collection directly
         users_collection = db["users"]
         
-        # First, check connection is alive
-        print("[MONGO] Checking MongoDB connection...")
-        await client.admin.command('ping')
-        print("[MONGO] MongoDB connection is healthy")
-        
-        print("[MONGO] Executing find({}) on users collection...")
         # Only fetch the fields we need: _id and phone_number
         projection = {"_id": 1, "phone_number": 1}
         cursor = users_collection.find({}, projection, batch_size=100).max_time_ms(30000)  # 30 second timeout
-        print("[MONGO] Using projection to fetch only _id and phone_number fields")
-        
-        print("[MONGO] Converting cursor to list...")
-        users = []
-        count = 0
-        async for user in cursor:
-            users.append(user)
-            count += 1
-            if count % 100 == 0:
-                print(f"[MONGO] Processed {count} users so far...")
-        
-        elapsed = time.time() - start_time
-        print(f"[MONGO] Fetched {len(users)} users in {elapsed:.2f} seconds")
+        users = await cursor.to_list(length=None)
         
         # Transform the data to include user_id as string version of _id
-        print("[MONGO] Transforming user_id fields...")
-        for idx, user in enumerate(users):
+        for user in users:
             user['user_id'] = str(user['_id'])
-            if (idx + 1) % 100 == 0:
-                print(f"[MONGO] Transformed {idx + 1} users...")
         
         total_elapsed = time.time() - start_time
-        print(f"[MONGO] Completed get_all_users, returning {len(users)} users (total time: {total_elapsed:.2f}s)")
-        return users if users else []
+        logger.debug("[MONGO] Completed get_all_users, returning %s users (total time: %.2fs)", len(users), total_elapsed)
+        return users
         
     except ExecutionTimeout as e:
-        print(f"[MONGO] ❌ Query timeout after 30 seconds: {e}")
+        logger.error("[MONGO] Query timeout after 30 seconds: %s", e)
         raise Exception(f"MongoDB query timeout: {e}")
     except ServerSelectionTimeoutError as e:
-        print(f"[MONGO] ❌ Cannot connect to MongoDB server: {e}")
+        logger.error("[MONGO] Cannot connect to MongoDB server: %s", e)
         raise Exception(f"MongoDB connection failed: {e}")
     except Exception as e:
         elapsed = time.time() - start_time
-        print(f"[MONGO] ❌ Error in get_all_users after {elapsed:.2f}s: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[MONGO] Error in get_all_users after %.2fs: %s: %s", elapsed, type(e).__name__, e)
         raise
 
 async def get_conversation_history(user_id: str) -> List[Dict]:
@@ -117,13 +153,13 @@ async def get_conversation_history(user_id: str) -> List[Dict]:
         if doc and "messages" in doc:
             # Get only the latest 10 messages
             latest_messages = doc["messages"][-10:]
-            print(f"📥 Retrieved {len(latest_messages)} messages (latest 10) from MongoDB for user {user_id}")
+            logger.debug("Retrieved %s messages (latest 10) from MongoDB for user %s", len(latest_messages), user_id)
             return latest_messages
         else:
-            print(f"📭 No conversation history found in MongoDB for user {user_id}")
+            logger.debug("No conversation history found in MongoDB for user %s", user_id)
             return []
     except Exception as e:
-        print(f"❌ Error retrieving conversation history for user {user_id}: {e}")
+        logger.error("Error retrieving conversation history for user %s: %s", user_id, e)
         return []
 
 async def save_message_to_history(user_id: str, message: Dict) -> bool:
@@ -148,20 +184,20 @@ async def save_message_to_history(user_id: str, message: Dict) -> bool:
                         "$slice": -MEMORY_MESSAGE_LIMIT  # Keep only the latest N messages
                     }
                 },
-                "$set": {"updated_at": datetime.now()}
+                "$set": {"updated_at": datetime.now(timezone.utc)}
             },
             upsert=True
         )
 
         if result.upserted_id or result.modified_count > 0:
-            print(f"💾 Saved message to MongoDB for user {user_id}")
+            logger.debug("Saved message to MongoDB for user %s", user_id)
             return True
         else:
-            print(f"⚠️ Failed to save message to MongoDB for user {user_id}")
+            logger.warning("Failed to save message to MongoDB for user %s", user_id)
             return False
 
     except Exception as e:
-        print(f"❌ Error saving message to MongoDB for user {user_id}: {e}")
+        logger.error("Error saving message to MongoDB for user %s: %s", user_id, e)
         return False
 
 async def migrate_memory_to_mongodb() -> int:
@@ -172,7 +208,7 @@ async def migrate_memory_to_mongodb() -> int:
     Returns:
         Always returns 0 since no migration is needed
     """
-    print("📭 No migration needed - using MongoDB as primary storage")
+    logger.info("No migration needed - using MongoDB as primary storage")
     return 0
 
 async def clear_conversation_history(user_id: str) -> bool:
@@ -188,11 +224,11 @@ async def clear_conversation_history(user_id: str) -> bool:
     try:
         result = await conversation_history_collection.delete_one({"user_id": user_id})
         if result.deleted_count > 0:
-            print(f"🗑️ Cleared conversation history for user {user_id}")
+            logger.info("Cleared conversation history for user %s", user_id)
             return True
         else:
-            print(f"📭 No conversation history found for user {user_id}")
+            logger.debug("No conversation history found for user %s", user_id)
             return False
     except Exception as e:
-        print(f"❌ Failed to clear conversation history for user {user_id}: {e}")
+        logger.error("Failed to clear conversation history for user %s: %s", user_id, e)
         return False
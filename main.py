@@ -1,6 +1,9 @@
 from datetime import datetime
+import asyncio
+import logging
 import os
 import json
+import orjson
 import pytz
 import uvicorn
 from db.mongo import client
@@ -22,11 +25,17 @@ from utils.cloud_tasks import enqueue_message
 from tools.scheduler import start_scheduler
 from ai.workflows.assistant import assistant_response
 from db.mongo import oauth_states_collection, oauth_tokens_collection
-from utils.utils import hash_data, send_whatsapp_message
+from utils.utils import hash_data, enqueue_whatsapp_message, google_client_config, PLAYGROUND_RECIPIENT
 
 # === Setup ===
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
 SCOPES = json.loads(os.getenv("SCOPES", "[]"))
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
 APP_URL = os.getenv("APP_URL")
@@ -52,6 +61,18 @@ async def lifespan(app: FastAPI):
     from tools.calendar import init_calendar_indexes
     await init_calendar_indexes()
     
+    # Initialize task indexes
+    from tools.task import init_task_indexes
+    await init_task_indexes()
+    
+    # Initialize waitlist indexes
+    from routers.user import init_waitlist_indexes
+    await init_waitlist_indexes()
+    
+    # Start the in-process WhatsApp send queue
+    from utils.utils import start_whatsapp_queue
+    await start_whatsapp_queue()
+    
     # Initialize Cloud Tasks scheduler for daily reminders
     # await start_scheduler()
     
@@ -59,6 +80,9 @@ async def lifespan(app: FastAPI):
 
     # === Shutdown ===
     print("🛑 Shutting down FastAPI app...")
+    from utils.utils import stop_whatsapp_queue, close_whatsapp_client
+    await stop_whatsapp_queue()
+    await close_whatsapp_client()
     await client.close()
     print("✅ MongoDB connection closed")
 
@@ -82,13 +106,16 @@ app.add_middleware(
 # Add request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"\n[REQUEST] {request.method} {request.url.path}")
-    print(f"[REQUEST] Headers: {dict(request.headers)}")
-    print(f"[REQUEST] Client: {request.client}")
-    
+    # Per-request logs are DEBUG so nothing is formatted or written in production;
+    # headers are never dumped because they carry bearer tokens
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("[REQUEST] %s %s from %s", request.method, request.url.path, request.client)
+
     response = await call_next(request)
-    
-    print(f"[RESPONSE] Status: {response.status_code}")
+
+    if debug:
+        logger.debug("[RESPONSE] %s %s -> %s", request.method, request.url.path, response.status_code)
     return response
 
 # === Globals ===
@@ -115,10 +142,10 @@ async def verify_webhook(request: Request):
 
 @app.post("/playground")
 async def admin_chat(request: Request):
-    data = await request.json()
-    sender = "601234567890"
+    data = orjson.loads(await request.body())
+    sender = PLAYGROUND_RECIPIENT
     text = data["message"]
-    print(f"Admin chat data: {data}")
+    logger.debug("Admin chat data: %s", data)
 
     # Queue the message for processing (like webhook)
     try:
@@ -127,10 +154,10 @@ async def admin_chat(request: Request):
             return {"status": "queued", "task_name": task_response.name}
         else:
             # Duplicate message detected, still process it directly
-            print(f"falling back to direct processing")
+            logger.info("Duplicate playground message, falling back to direct processing")
             return await assistant_response(sender, text, True)
     except Exception as e:
-        print(f"Queue failed, falling back to direct processing: {e}")
+        logger.warning("Queue failed, falling back to direct processing: %s", e)
         return await assistant_response(sender, text, True)
 
 @app.post("/worker/process-message")
@@ -140,37 +167,32 @@ async def process_message_worker(request: Request):
     Called by Cloud Tasks asynchronously.
     """
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         sender = data.get("sender")
         text = data.get("text")
         message_id = data.get("message_id")
         timestamp = data.get("timestamp")
         
-        print(f"\n[WORKER] Processing queued message")
-        print(f"[WORKER] Sender: {sender}")
-        print(f"[WORKER] Text: {text}")
-        print(f"[WORKER] Message ID: {message_id}")
-        print(f"[WORKER] Queued at: {timestamp}")
+        logger.debug("[WORKER] Processing queued message %s from %s (queued at %s): %s",
+                     message_id, sender, timestamp, text)
         
         if not sender or not text:
-            print(f"[WORKER] ❌ Missing required fields: sender={sender}, text={text}")
+            logger.error("[WORKER] Missing required fields: sender=%s, text=%s", sender, text)
             return {"status": "error", "message": "Missing sender or text"}
         
         # Process the message through the assistant
         result = await assistant_response(sender, text)
         
-        print(f"[WORKER] ✅ Message processed successfully")
+        logger.debug("[WORKER] Message %s processed successfully", message_id)
         return {"status": "success", "result": result}
         
     except Exception as e:
-        print(f"[WORKER] ❌ Error processing message: {e}")
-        import traceback
-        print(f"[WORKER] Full traceback: {traceback.format_exc()}")
+        logger.exception("[WORKER] Error processing message: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/auth/callback")
 async def receive_whatsapp(request: Request):
-    data = await request.json()
+    data = orjson.loads(await request.body())
 
     try:
         entry = data["entry"][0]
@@ -179,7 +201,7 @@ async def receive_whatsapp(request: Request):
         messages = value.get("messages")
 
         if not messages:
-            print("⚠️ No incoming WhatsApp message found.")
+            logger.debug("No incoming WhatsApp message found.")
             return {"ok": True}
 
         message = messages[0]
@@ -187,15 +209,14 @@ async def receive_whatsapp(request: Request):
         text = message["text"]["body"]
         message_id = message.get("id")  # WhatsApp message ID for deduplication
 
-        print(f"📨 Received message from {sender}: {text} (ID: {message_id})")
+        logger.debug("Received message from %s: %s (ID: %s)", sender, text, message_id)
 
         # ✅ Step 1: Check if user exists in MongoDB
         hashed_sender = hash_data(sender)
-        print(f"Hashed sender: {hashed_sender}")
         user = await users_collection.find_one({"hashed_phone_number": hashed_sender})
 
         if not user:
-            print(f"👤 New user detected: {sender} — initiating onboarding.")
+            logger.info("New user detected: %s — initiating onboarding.", sender)
 
             # Step 3: Send onboarding message
             onboarding_url = f"{FRONTEND_URL}/onboarding?phone_number={sender}"
@@ -206,7 +227,8 @@ async def receive_whatsapp(request: Request):
                 "Lofy Assistant, created by Ilham Ghazi & Meor Izzuddin\n\n"
             )
 
-            await send_whatsapp_message(sender, onboarding_message)
+            # Queue the send so the webhook acks Meta without waiting on the Graph API
+            enqueue_whatsapp_message(sender, onboarding_message)
 
             # Stop further processing
             return {"ok": True}
@@ -216,16 +238,15 @@ async def receive_whatsapp(request: Request):
         
         try:
             await enqueue_message(sender, text, message_id)
-            print(f"✅ Message from {sender} queued successfully")
+            logger.debug("Message from %s queued successfully", sender)
             return {"ok": True, "status": "queued"}
         except Exception as enqueue_error:
-            print(f"❌ Failed to enqueue message: {enqueue_error}")
             # Fallback to inline processing if queue fails
-            print(f"⚠️ Falling back to inline processing")
+            logger.warning("Failed to enqueue message, falling back to inline processing: %s", enqueue_error)
             return await assistant_response(sender, text)
 
     except Exception as e:
-        print(f"❌ Error in receive_whatsapp: {e}")
+        logger.error("Error in receive_whatsapp: %s", e)
         return {"ok": False, "error": str(e)}
 
 @app.get("/auth/google_callback")
@@ -249,17 +270,21 @@ async def auth_callback(request: Request):
 
     user_id = state_data["user_id"]
 
-    flow = Flow.from_client_secrets_file(
-        "credentials.json",
+    # Flow setup uses the cached client config; only fetch_token makes a blocking
+    # HTTPS call, so that alone runs in the executor
+    flow = Flow.from_client_config(
+        google_client_config(),
         scopes=SCOPES,
         redirect_uri=redirect_uri,
         state=state
     )
 
+    loop = asyncio.get_running_loop()
+
     try:
-        flow.fetch_token(code=code)
+        await loop.run_in_executor(None, lambda: flow.fetch_token(code=code))
     except Exception as e:
-        print("⚠️ fetch_token error:", e)
+        logger.warning("fetch_token error: %s", e)
         return RedirectResponse(
             url=f"{FRONTEND_URL}/auth-result?status=error&reason=fetch_token_failed",
             status_code=303
@@ -268,23 +293,28 @@ async def auth_callback(request: Request):
     credentials = flow.credentials
 
     if not credentials or not credentials.token:
-        print("❌ No credentials found after fetch_token")
+        logger.warning("No credentials found after fetch_token")
         return RedirectResponse(
             url=f"{FRONTEND_URL}/auth-result?status=error&reason=no_credentials",
             status_code=303
         )
 
+    # Update the stored token field by field so a re-authorization that comes
+    # back without a refresh_token doesn't wipe the one we already have
+    token_update = {
+        "token.token": credentials.token,
+        "token.token_uri": credentials.token_uri,
+        "token.client_id": credentials.client_id,
+        "token.client_secret": credentials.client_secret,
+        "token.scopes": credentials.scopes,
+        "token.expiry": credentials.expiry.isoformat() if credentials.expiry else None
+    }
+    if credentials.refresh_token:
+        token_update["token.refresh_token"] = credentials.refresh_token
+
     await oauth_tokens_collection.update_one(
         {"user_id": user_id},
-        {"$set": {"token": {
-            "token": credentials.token,
-            "refresh_token": credentials.refresh_token,
-            "token_uri": credentials.token_uri,
-            "client_id": credentials.client_id,
-            "client_secret": credentials.client_secret,
-            "scopes": credentials.scopes,
-            "expiry": credentials.expiry.isoformat() if credentials.expiry else None
-        }}},
+        {"$set": token_update},
         upsert=True
     )
 
@@ -1,3 +1,5 @@
+import asyncio
+from pymongo import UpdateOne
 from db.mongo import users_collection
 
 def migrate_metadata(doc):
@@ -21,17 +23,25 @@ def migrate_metadata(doc):
 
     return metadata
 
-# Update all documents
-for doc in users_collection.find():
-    new_metadata = migrate_metadata(doc)
-    users_collection.update_one(
-        {"_id": doc["_id"]},
-        {
-            "$set": {
-                "metadata": new_metadata,
-                "onboarding_completed": True
+async def main():
+    # Update all documents in a single unordered bulk write
+    operations = []
+    async for doc in users_collection.find({}, {"metadata": 1}):
+        new_metadata = migrate_metadata(doc)
+        operations.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {
+                "$set": {
+                    "metadata": new_metadata,
+                    "onboarding_completed": True
+                }
             }
-        }
-    )
+        ))
 
-print("✅ Migration completed!")
\ No newline at end of file
+    if operations:
+        await users_collection.bulk_write(operations, ordered=False)
+
+    print("✅ Migration completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+import uuid
+from pymongo import UpdateOne
+from db.mongo import db
+from tools.task import tasks_collection, init_task_indexes
+
+# Legacy layout: one document per user with an embedded "tasks" array
+task_list_collection = db["task_list"]
+
+def flatten_tasks(doc):
+    user_id = doc["user_id"]
+    operations = []
+
+    for index, task in enumerate(doc.get("tasks", [])):
+        task_doc = dict(task)
+        task_doc["user_id"] = user_id
+
+        # Step 1: Older tasks may predate task_id; derive a stable one so a re-run
+        # maps the same legacy task to the same id instead of inserting it again
+        if not task_doc.get("task_id"):
+            seed = f"{user_id}:{index}:{task_doc.get('created_at')}"
+            task_doc["task_id"] = str(uuid.uuid5(uuid.NAMESPACE_OID, seed))
+
+        # Step 2: Sorting on updated_at needs it on every task
+        if not task_doc.get("updated_at"):
+            task_doc["updated_at"] = task_doc.get("created_at")
+
+        # Step 3: Upsert on (user_id, task_id) so re-running is safe
+        operations.append(UpdateOne(
+            {"user_id": user_id, "task_id": task_doc["task_id"]},
+            {"$setOnInsert": task_doc},
+            upsert=True
+        ))
+
+    return operations
+
+async def main():
+    await init_task_indexes()
+
+    migrated = 0
+    async for doc in task_list_collection.find({"tasks.0": {"$exists": True}}):
+        operations = flatten_tasks(doc)
+        if operations:
+            result = await tasks_collection.bulk_write(operations, ordered=False)
+            migrated += result.upserted_count
+
+    print(f"✅ Migration completed! {migrated} tasks copied to the tasks collection")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,11 @@
-import asyncio
 import traceback
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from db.mongo import get_all_users as get_all_users_mongo
-from utils.utils import send_whatsapp_message, send_whatsapp_template, decrypt_phone
-from utils.cloud_tasks import enqueue_announcement
+from utils.utils import send_whatsapp_message, send_whatsapp_template, decrypt_phones_bulk
+from utils.cloud_tasks import enqueue_announcements_bulk
 from ai.workflows.assistant import get_cache_stats, clear_user_cache, warm_cache_for_active_users, schedule_cache_warming
 
 load_dotenv(dotenv_path=".env.local", override=True)
@@ -32,7 +31,7 @@ async def announcement(request: Request, data: AnnouncementPayload):
     """
     Queue announcement messages to all users via Cloud Tasks.
     This endpoint responds quickly while the actual sending happens asynchronously.
-    Processes users in batches to avoid timeouts with large user bases.
+    Enqueues are issued concurrently (bounded) to avoid timeouts with large user bases.
     """
     print(f"\n[ANNOUNCEMENT] Endpoint HIT!")
     print(f"[ANNOUNCEMENT] use_template: {data.use_template}, template_name: {data.template_name}")
@@ -49,40 +48,29 @@ async def announcement(request: Request, data: AnnouncementPayload):
         if not users:
             return {"message": "No users found to send announcement to"}
         
-        # Process in batches to avoid timeout
-        BATCH_SIZE = 50  # Process 50 users at a time
-        queued_count = 0
-        failed_count = 0
+        # Decrypt every phone number up front in one pass, off the event loop
+        phones = await decrypt_phones_bulk([user.get("phone_number") for user in users])
         
-        print(f"[ANNOUNCEMENT] Processing {total_users} users in batches of {BATCH_SIZE}...")
+        valid_phones = []
+        failed_count = 0
+        for user, decrypted_phone in zip(users, phones):
+            if not decrypted_phone:
+                print(f"[ANNOUNCEMENT] Error preparing task for user {user.get('user_id', 'NO_ID')}: could not decrypt phone number")
+                failed_count += 1
+                continue
+            valid_phones.append(decrypted_phone)
         
-        for batch_num in range(0, total_users, BATCH_SIZE):
-            batch = users[batch_num:batch_num + BATCH_SIZE]
-            batch_tasks = []
-            
-            for user in batch:
-                try:
-                    decrypted_phone = decrypt_phone(user["phone_number"])
-                    batch_tasks.append(enqueue_announcement(
-                        phone_number=decrypted_phone,
-                        announcement=data.announcement,
-                        use_template=data.use_template,
-                        template_name=data.template_name
-                    ))
-                except Exception as e:
-                    print(f"[ANNOUNCEMENT] Error preparing task for user {user.get('user_id', 'NO_ID')}: {e}")
-                    failed_count += 1
-            
-            # Queue this batch
-            if batch_tasks:
-                results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-                for result in results:
-                    if isinstance(result, Exception):
-                        failed_count += 1
-                    else:
-                        queued_count += 1
-                
-                print(f"[ANNOUNCEMENT] Batch {batch_num//BATCH_SIZE + 1}: Queued {len([r for r in results if not isinstance(r, Exception)])}/{len(batch_tasks)} tasks")
+        # Queue every recipient concurrently (bounded) over the shared Cloud Tasks client
+        print(f"[ANNOUNCEMENT] Queueing {len(valid_phones)} users...")
+        results = await enqueue_announcements_bulk(
+            valid_phones,
+            announcement=data.announcement,
+            use_template=data.use_template,
+            template_name=data.template_name
+        )
+        enqueue_failures = sum(isinstance(result, Exception) for result in results)
+        queued_count = len(results) - enqueue_failures
+        failed_count += enqueue_failures
         
         print(f"[ANNOUNCEMENT] ✅ Completed: {queued_count} queued, {failed_count} failed")
 
@@ -1,16 +1,16 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from db.mongo import client
 from utils.utils import get_current_user, get_dashboard_events
+from tools.task import tasks_collection, TASK_PROJECTION
 
 load_dotenv(dotenv_path=".env.local", override=True)
 
 db_name = os.environ.get("DB_NAME")
 db = client[db_name]
-tasks_collection = db["task_list"]
 bugs_collection = db["bugs"]
 
 class BugPayload(BaseModel):
@@ -23,9 +23,9 @@ router = APIRouter()
 @router.get("/get_dashboard_info")
 async def dashboard(current_user: dict = Depends(get_current_user)):
     user_id = current_user["user_id"]
-    tasks_doc = await tasks_collection.find_one({"user_id": user_id})
-
-    tasks_list = tasks_doc["tasks"] if tasks_doc and "tasks" in tasks_doc else []
+    tasks_list = await tasks_collection.find(
+        {"user_id": user_id}, TASK_PROJECTION
+    ).sort("created_at", 1).to_list(length=None)
     
     # Get dashboard events for the next 4 days (today + next 3 days)
     events_data = await get_dashboard_events(user_id)
@@ -42,6 +42,6 @@ async def report_bug(bug: BugPayload):
         "user_id": bug.user_id,
         "title": bug.title,
         "description": bug.description,
-        "created_at": datetime.now()
+        "created_at": datetime.now(timezone.utc)
     })
     return {"message": "Bug reported successfully"}
\ No newline at end of file
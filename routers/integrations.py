@@ -27,5 +27,5 @@ async def get_integrations(user_id: str = Query(...)):
 @router.get("/google_auth_url")
 async def google_auth_url(current_user: dict = Depends(get_current_user)):
     user_id = current_user["user_id"]
-    auth_url = get_auth_url(user_id)
+    auth_url = await get_auth_url(user_id)
     return {"auth_url": auth_url}
\ No newline at end of file
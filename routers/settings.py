@@ -4,7 +4,6 @@ from pydantic import BaseModel
 from typing import List
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from jose import jwt
 from bson import ObjectId
 from db.mongo import client
 from utils.utils import hash_data
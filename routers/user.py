@@ -1,6 +1,7 @@
 # app/user.py
 import random
 import hashlib
+import logging
 from bson import ObjectId
 import os
 from fastapi import APIRouter, HTTPException, status
@@ -8,10 +9,13 @@ from pydantic import BaseModel
 from typing import List
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from jose import jwt
+import jwt
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import pytz
-from db.mongo import client
-from utils.cloud_tasks import schedule_daily_task
+from db.mongo import client, users_phone_index_ready
+from utils.cloud_tasks import schedule_daily_tasks
+from tools.scheduler import daily_reminder_specs
 from utils.utils import hash_data, encrypt_phone, send_whatsapp_message
 
 load_dotenv(dotenv_path=".env.local", override=True)
@@ -20,6 +24,9 @@ FRONTEND_URL = os.getenv("FRONTEND_URL")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 day
 app_url = os.getenv("APP_URL")
+KL_TZ = pytz.timezone("Asia/Kuala_Lumpur")
+
+logger = logging.getLogger(__name__)
 
 with open("ai/prompts/onboarding_guide.txt", "r", encoding="utf-8") as f:
     onboarding_guide_prompt = f.read()
@@ -34,6 +41,15 @@ waitlist_collection = db["waitlist"]
 integrations_collection = db["integrations"]
 settings_collection = db["settings"]
 
+# Index creation runs from the FastAPI lifespan in main.py
+async def init_waitlist_indexes():
+    """Initialize waitlist collection indexes"""
+    try:
+        await waitlist_collection.create_index("phone_number", unique=True)
+        logger.info("Created unique index on phone_number for waitlist collection")
+    except Exception as e:
+        logger.warning("Waitlist index creation failed (might already exist): %s", e)
+
 class Metadata(BaseModel):
     about_yourself: str
     profession: str
@@ -73,18 +89,19 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 async def _check_phone_number_exists(hashed_phone: str) -> bool:
     """Utility function to check if a hashed phone number exists in the database"""
-    user = await users_collection.find_one({"hashed_phone_number": hashed_phone})
+    user = await users_collection.find_one({"hashed_phone_number": hashed_phone}, {"_id": 1})
     return bool(user)
 
 async def send_onboarding_guide(phone_number: int):
     onboarding_url = f"{FRONTEND_URL}/guide"
     formatted_message = onboarding_guide_prompt.format(onboarding_url=onboarding_url)
+    # Awaited rather than queued: Cloud Run throttles CPU once the response is sent
     await send_whatsapp_message(phone_number, formatted_message)
     return {"message": "Onboarding guide sent successfully"}
 
 @router.post("/user_onboarding")
 async def create_user(data: UserPayload):
-    print(f"Received user: {data}")
+    logger.debug("Received user: %s", data)
 
     try:
         # Hash PIN and phone_number
@@ -92,13 +109,13 @@ async def create_user(data: UserPayload):
         encrypted_phone = encrypt_phone(str(data.phone_number))
         hashed_phone = hash_data(str(data.phone_number))
 
-        # Check if user already exists (by hashed phone number)
-        if await _check_phone_number_exists(hashed_phone):  # pass hashed here!
+        # Without the unique index (init_mongodb failed to create it) the insert
+        # can't reject duplicates, so check first
+        if not users_phone_index_ready() and await _check_phone_number_exists(hashed_phone):
             raise HTTPException(status_code=400, detail="User with this phone number already exists")
 
         # Get current timestamp
-        tz = pytz.timezone("Asia/Kuala_Lumpur")
-        now = datetime.now(tz)
+        now = datetime.now(KL_TZ)
 
         # Prepare user document for MongoDB
         user_doc = {
@@ -118,32 +135,22 @@ async def create_user(data: UserPayload):
             "updated_at": now
         }
 
-        # Insert user into MongoDB
-        result = await users_collection.insert_one(user_doc)
+        # Insert user into MongoDB (unique index on hashed_phone_number rejects duplicates)
+        try:
+            result = await users_collection.insert_one(user_doc)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="User with this phone number already exists")
         user_id_str = str(result.inserted_id)
 
         token = create_access_token(data={"user_id": user_id_str})
         await send_onboarding_guide(data.phone_number)
         
 
-        today_url = f"{app_url}/reminder/daily/today/user"
-        tomorrow_url = f"{app_url}/reminder/daily/tomorrow/user"
-        await schedule_daily_task(
-            endpoint_url=today_url,
-            task_name=f"today-reminder-{user_id_str}",
-            hour=8,
-            minute=30,
-            timezone_str="Asia/Kuala_Lumpur",
-            request_body={"user_id": user_id_str}
-        )
-        await schedule_daily_task(
-            endpoint_url=tomorrow_url,
-            task_name=f"tomorrow-reminder-{user_id_str}",
-            hour=19,
-            minute=30,
-            timezone_str="Asia/Kuala_Lumpur",
-            request_body={"user_id": user_id_str}
-        )
+        # Schedule both daily reminders concurrently; a failure here shouldn't fail signup
+        results = await schedule_daily_tasks(daily_reminder_specs(user_id_str))
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Error scheduling daily reminder for user %s: %s", user_id_str, result)
         return {
             "token": token,
             "message": "User created successfully",
@@ -152,42 +159,37 @@ async def create_user(data: UserPayload):
             "email": data.email
         }
 
+    except HTTPException:
+        # Re-raise HTTP exceptions (400 duplicate user)
+        raise
     except Exception as e:
-        print(f"Error creating user: {e}")
+        logger.error("Error creating user: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create user")
 
 @router.post("/login")
 async def login_user(data: UserLoginPayload):
-    print(f"Received login attempt for phone: {data.phone_number}")
+    logger.debug("Received login attempt for phone: %s", data.phone_number)
     
     try:
         # Hash PIN and phone_number
         hashed_pin = hash_data(str(data.PIN))
         hashed_phone = hash_data(str(data.phone_number))
-        print(f"Hashed phone: {hashed_phone}")
+        logger.debug("Hashed phone: %s", hashed_phone)
         
-        # Find user by hashed phone number
-        user = await users_collection.find_one({"hashed_phone_number": hashed_phone})
+        # Match phone + PIN and stamp the login in one round trip
+        now = datetime.now(KL_TZ)
+        user = await users_collection.find_one_and_update(
+            {"hashed_phone_number": hashed_phone, "PIN": hashed_pin},
+            {"$set": {"last_login": now, "updated_at": now}},
+            projection={"nickname": 1, "email": 1, "language": 1},
+            return_document=ReturnDocument.AFTER
+        )
         
         if not user:
-            print(f"User not found: {data.phone_number}")
-            raise HTTPException(status_code=401, detail="Invalid phone number or PIN")
-        
-        # Verify PIN
-        if user["PIN"] != hashed_pin:
-            print(f"Invalid PIN: {user.get('nickname', 'Unknown')}")
+            logger.info("Invalid phone number or PIN: %s", data.phone_number)
             raise HTTPException(status_code=401, detail="Invalid phone number or PIN")
         
-        # Update last login timestamp
-        tz = pytz.timezone("Asia/Kuala_Lumpur")
-        now = datetime.now(tz)
-        
-        await users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"last_login": now, "updated_at": now}}
-        )
-        
-        print(f"Successful login for user: {user.get('nickname', 'Unknown')}")
+        logger.info("Successful login for user: %s", user.get("nickname", "Unknown"))
         
         # Return success response (excluding sensitive data)
         token = create_access_token(data={"user_id": str(user["_id"])})
@@ -204,14 +206,14 @@ async def login_user(data: UserLoginPayload):
         # Re-raise HTTP exceptions (401 errors)
         raise
     except Exception as e:
-        print(f"Error during login: {e}")
+        logger.error("Error during login: %s", e)
         raise HTTPException(status_code=500, detail="Login failed")
 
 @router.post("/check_phone_number_exist", status_code=status.HTTP_200_OK)
 async def check_phone_number_exist(data: dict):
     try:
         phone_number = data.get("phone_number")
-        print(f"Checking phone number: {phone_number}")
+        logger.debug("Checking phone number: %s", phone_number)
         if not phone_number:
             raise HTTPException(status_code=400, detail="Invalid phone number")
 
@@ -223,7 +225,7 @@ async def check_phone_number_exist(data: dict):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] /check_user_exist: {e}")
+        logger.error("/check_user_exist: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Something went wrong while checking user existence."
@@ -231,7 +233,7 @@ async def check_phone_number_exist(data: dict):
 
 @router.post("/logout")
 async def logout(data: LogoutPayload):
-    print(f"Logging out user for phone: {data.phone_number}")
+    logger.debug("Logging out user for phone: %s", data.phone_number)
 
     try:
         hashed_phone = hash_data(data.phone_number)
@@ -249,27 +251,31 @@ async def logout(data: LogoutPayload):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error during logout: {e}")
+        logger.error("Error during logout: %s", e)
         raise HTTPException(status_code=500, detail="❌ Logout failed")
     
 @router.post("/waitlist")
 async def waitlist(req: WaitlistPayload):
     phone_number = req.phone_number
-    print(f"Adding to waitlist: {phone_number}")
+    logger.debug("Adding to waitlist: %s", phone_number)
 
     try:
-        await waitlist_collection.insert_one({"phone_number": phone_number})
+        try:
+            await waitlist_collection.insert_one({"phone_number": phone_number})
+        except DuplicateKeyError:
+            # Already on the waitlist; repeated submissions are a no-op
+            logger.debug("Already on waitlist: %s", phone_number)
         return {
             "message": "✅ Added to waitlist successfully",
             "phone_number": phone_number
         }
     except Exception as e:
-        print(f"Error during waitlist: {e}")
+        logger.error("Error during waitlist: %s", e)
         raise HTTPException(status_code=500, detail="❌ Failed to add to waitlist")
     
 @router.post("/change_pin")
 async def change_pin(data: ChangePinRequest):
-    print(f"Change PIN request for user_id: {data.user_id}")
+    logger.debug("Change PIN request for user_id: %s", data.user_id)
     user = await users_collection.find_one({"_id": ObjectId(data.user_id)})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -280,14 +286,17 @@ async def change_pin(data: ChangePinRequest):
     
 @router.post("/forgot_pin")
 async def forgot_pin(data: ForgotPinRequest):
-    print(f"Forgot PIN request for phone: {data.phone_number}")
+    logger.debug("Forgot PIN request for phone: %s", data.phone_number)
     hashed_phone = hash_data(data.phone_number)
     user = await users_collection.find_one({"hashed_phone_number": hashed_phone})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     pin = random.randint(100000, 999999)  # ensures always 6 digits
-    print(f"New PIN: {pin}")
     await users_collection.update_one({"hashed_phone_number": hashed_phone}, {"$set": {"PIN": hash_data(str(pin))}})
-    await send_whatsapp_message(data.phone_number, "Your New Temporary PIN is: " + str(pin) + ". Please change this PIN once you login to your account.")
+    # The message is the only copy of the new PIN, so send it before responding
+    result = await send_whatsapp_message(data.phone_number, "Your New Temporary PIN is: " + str(pin) + ". Please change this PIN once you login to your account.")
+    if result.get("status") != "success":
+        logger.error("Failed to send temporary PIN for user %s: %s", user["_id"], result)
+        raise HTTPException(status_code=502, detail="❌ Failed to send PIN, please try again")
     return {"message": "✅ PIN sent to phone number"}
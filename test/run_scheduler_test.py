@@ -6,6 +6,7 @@ Run this to test your reminder jobs without deployment
 
 import os
 import sys
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables and set test mode
@@ -17,44 +18,32 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 print(f"Project root: {project_root}")  # Debug print
 
-async def test_today_reminder():
+def run_today_reminder(user_id):
     """Test today's reminder job"""
-    from tools.scheduler import start_scheduler
+    from tools.scheduler import today_reminder_job
     
     print("🌅 Testing TODAY's reminder job...")
-    print("Setting up scheduler...")
     
-    # Import the functions we need after setting test mode
-    from tools.scheduler import trigger_today_reminder_manually
-    
-    # Start scheduler to initialize everything
-    await start_scheduler()
-    
-    # Manually trigger the job
-    trigger_today_reminder_manually()
+    # Call the job directly, no scheduler needed
+    result = asyncio.run(today_reminder_job(user_id))
+    print(f"Result: {result}")
 
-async def test_tomorrow_reminder():
+def run_tomorrow_reminder(user_id):
     """Test tomorrow's reminder job"""
-    from tools.scheduler import start_scheduler
+    from tools.scheduler import tomorrow_reminder_job
     
     print("🌙 Testing TOMORROW's reminder job...")
-    print("Setting up scheduler...")
-    
-    # Import the functions we need after setting test mode
-    from tools.scheduler import trigger_tomorrow_reminder_manually
-    
-    # Start scheduler to initialize everything
-    await start_scheduler()
     
-    # Manually trigger the job
-    trigger_tomorrow_reminder_manually()
+    # Call the job directly, no scheduler needed
+    result = asyncio.run(tomorrow_reminder_job(user_id))
+    print(f"Result: {result}")
 
-def test_both():
+def run_both(user_id):
     """Test both reminder jobs"""
     print("🧪 Testing BOTH reminder jobs...")
-    test_today_reminder()
+    run_today_reminder(user_id)
     print("\n" + "="*60 + "\n")
-    test_tomorrow_reminder()
+    run_tomorrow_reminder(user_id)
 
 if __name__ == "__main__":
     print("📋 Scheduler Test Runner")
@@ -62,20 +51,22 @@ if __name__ == "__main__":
     print("=" * 70)
     
     print("\nChoose test:")
-    print("1. Today's reminder (9 AM job)")
-    print("2. Tomorrow's reminder (10:20 PM job)")
+    print("1. Today's reminder (8:30 AM job)")
+    print("2. Tomorrow's reminder (7:30 PM job)")
     print("3. Both")
     print("4. Exit")
     
     choice = input("\nEnter choice (1-4): ").strip()
+    if choice in ("1", "2", "3"):
+        user_id = input("Enter user_id: ").strip()
     
     try:
         if choice == "1":
-            test_today_reminder()
+            run_today_reminder(user_id)
         elif choice == "2":
-            test_tomorrow_reminder()
+            run_tomorrow_reminder(user_id)
         elif choice == "3":
-            test_both()
+            run_both(user_id)
         elif choice == "4":
             print("👋 Goodbye!")
             sys.exit(0)
@@ -6,14 +6,15 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from db.mongo import get_all_users, client
+import asyncio
 import time
 
-def test_connection():
+async def check_connection():
     """Test basic MongoDB connection"""
     print("\n=== Testing MongoDB Connection ===")
     try:
         start = time.time()
-        result = client.admin.command('ping')
+        result = await client.admin.command('ping')
         elapsed = time.time() - start
         print(f"✅ Ping successful in {elapsed:.3f}s: {result}")
         return True
@@ -21,13 +22,13 @@ def test_connection():
         print(f"❌ Ping failed: {e}")
         return False
 
-def test_user_count():
+async def check_user_count():
     """Test getting user count without fetching all data"""
     print("\n=== Testing User Count ===")
     try:
         from db.mongo import users_collection
         start = time.time()
-        count = users_collection.count_documents({})
+        count = await users_collection.count_documents({})
         elapsed = time.time() - start
         print(f"✅ Total users: {count} (query took {elapsed:.3f}s)")
         return count
@@ -35,12 +36,12 @@ def test_user_count():
         print(f"❌ Count failed: {e}")
         return None
 
-def test_get_all_users():
+async def check_get_all_users():
     """Test fetching all users"""
     print("\n=== Testing get_all_users() ===")
     start = time.time()
     try:
-        users = get_all_users()
+        users = await get_all_users()
         elapsed = time.time() - start
         print(f"✅ Successfully fetched {len(users)} users in {elapsed:.3f}s")
         
@@ -58,18 +59,18 @@ def test_get_all_users():
         traceback.print_exc()
         return None
 
-def main():
+async def main():
     print("="*80)
     print("MongoDB Connection Diagnostic Tool")
     print("="*80)
     
     # Test 1: Connection
-    if not test_connection():
+    if not await check_connection():
         print("\n⚠️ Cannot proceed - MongoDB connection failed")
         return
     
     # Test 2: Count users
-    count = test_user_count()
+    count = await check_user_count()
     if count is None:
         print("\n⚠️ Cannot proceed - User count failed")
         return
@@ -78,7 +79,7 @@ def main():
     print(f"\n⚠️ About to fetch {count} users from database...")
     input("Press Enter to continue...")
     
-    users = test_get_all_users()
+    users = await check_get_all_users()
     
     print("\n" + "="*80)
     if users:
@@ -88,5 +89,5 @@ def main():
     print("="*80)
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
 
@@ -1,6 +1,7 @@
 from __future__ import print_function
 import datetime
 import os.path
+import re
 import pytz
 import dateparser
 import json
@@ -24,6 +25,15 @@ load_dotenv(dotenv_path=".env.local", override=True)  # Make sure environment va
 
 # MongoDB Calendar Collection
 calendar_collection = db["calendar"]
+# pytz rather than zoneinfo: the create/update paths rely on tz.localize()
+KL_TZ = pytz.timezone("Asia/Kuala_Lumpur")
+
+# get_events range classification, one precompiled pass each instead of a scan per keyword.
+# A "month" request names a month and has no day indicator (digits 1-9 or an ordinal suffix)
+MONTH_NAME_PATTERN = re.compile(
+    "january|february|march|april|may|june|july|august|september|october|november|december"
+)
+DAY_INDICATOR_PATTERN = re.compile("[1-9]|st|nd|rd|th")
 
 # Index creation moved to FastAPI lifespan in main.py
 # Async index creation function for proper initialization
@@ -49,7 +59,7 @@ async def create_event(time: str = None, end_time: str = None, date: str = None,
     
     print(f"Creating event for user_id: {user_id}")
     
-    tz = pytz.timezone('Asia/Kuala_Lumpur')
+    tz = KL_TZ
     
     if time and end_time:
         # Timed event
@@ -136,7 +146,7 @@ async def create_event(time: str = None, end_time: str = None, date: str = None,
     if not event.get('is_all_day', False):
         try:
             # Get user's phone number from database
-            user_doc = await users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await users_collection.find_one({"_id": ObjectId(user_id)}, {"phone_number": 1})
             if user_doc and 'phone_number' in user_doc:
                 phone_number = user_doc['phone_number']
                 # Create event reminder
@@ -276,7 +286,7 @@ async def update_event(user_id=None, original_title=None, new_title=None, new_da
         return f"❌ No event found with title '{original_title}'."
     
     # Build update dict
-    tz = pytz.timezone('Asia/Kuala_Lumpur')
+    tz = KL_TZ
     update_data = {"updated_at": datetime.now(tz)}
     
     if new_title:
@@ -391,7 +401,7 @@ async def get_events(natural_range="today", user_id=None):
     if user_id is None:
         raise ValueError("Missing user_id in get_events() call!")
     
-    tz = pytz.timezone("Asia/Kuala_Lumpur")
+    tz = KL_TZ
     now = datetime.now(tz)
     print(f"[DEBUG] current time: {now}")
 
@@ -412,16 +422,10 @@ async def get_events(natural_range="today", user_id=None):
     print(f"[DEBUG] Parsed date_range: {date_range}")
 
     # Check if input looks like a month (e.g., "july 2025") but not a specific date
-    month_keywords = [
-        "january", "february", "march", "april", "may", "june",
-        "july", "august", "september", "october", "november", "december"
-    ]
     # Only consider it a month request if:
     # 1. Contains a month name AND
     # 2. Does NOT contain day indicators (numbers 1-31, "st", "nd", "rd", "th")
-    has_month = any(m in natural_range for m in month_keywords)
-    has_day_indicator = any(str(i) in natural_range for i in range(1, 32)) or any(suffix in natural_range for suffix in ["st", "nd", "rd", "th"])
-    is_month = has_month and not has_day_indicator
+    is_month = bool(MONTH_NAME_PATTERN.search(natural_range)) and not DAY_INDICATOR_PATTERN.search(natural_range)
 
     if is_month and date_range:
         start_time = date_range.replace(day=1)
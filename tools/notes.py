@@ -1,6 +1,6 @@
 
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import uuid
 from db.mongo import client
 from openai import OpenAI
@@ -13,6 +13,7 @@ load_dotenv(dotenv_path=".env.local", override=True)
 db_name = os.environ.get("DB_NAME")
 db = client[db_name]
 notes_collection = db["notes"]
+KL_TZ = ZoneInfo("Asia/Kuala_Lumpur")
 
 # OpenAI client for embeddings
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -69,7 +70,7 @@ async def create_note(user_id: str = None, content: str = None, title: str = Non
         raise ValueError("Failed to generate embedding for note content")
     
     # Create note object
-    tz = pytz.timezone("Asia/Kuala_Lumpur")
+    tz = KL_TZ
     now = datetime.now(tz)
     
     note = {
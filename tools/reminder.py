@@ -1,14 +1,15 @@
 import json
+import re
+import threading
 import os.path
 import pytz
 import dateparser
+from zoneinfo import ZoneInfo
 import asyncio
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from db.mongo import oauth_tokens_collection
-from utils.utils import send_whatsapp_message, get_event_loop
+from utils.utils import send_whatsapp_message
 from bson import ObjectId
 from db.mongo import client
 import os
@@ -26,6 +27,10 @@ db = client[db_name]  # Using same database as existing oauth collections
 reminders_collection = db["reminders"]
 
 SCOPES = json.loads(os.getenv("SCOPES", "[]"))
+KL_TZ = ZoneInfo("Asia/Kuala_Lumpur")
+
+# Manual fallback for bare clock times like "6pm", "6:30pm", "18:00"
+TIME_PATTERN = re.compile(r'^(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$')
 
 class AuthRequiredError(Exception):
     pass
@@ -44,7 +49,7 @@ async def create_custom_reminder(message: str, remind_in: str, user_id=None, pho
         raise ValueError("Missing user_id in create_custom_reminder() call!")
     
     # Parse the time
-    tz = pytz.timezone("Asia/Kuala_Lumpur")
+    tz = KL_TZ
     now = datetime.now(tz)
     
     # Preprocess the remind_in text to normalize common phrases
@@ -69,7 +74,7 @@ async def create_custom_reminder(message: str, remind_in: str, user_id=None, pho
         remind_in_normalized = "in 1 minute"
     
     # Ensure "in" prefix for relative times
-    if remind_in_normalized.endswith(" minutes") or remind_in_normalized.endswith(" hours") or remind_in_normalized.endswith(" days"):
+    if remind_in_normalized.endswith((" minutes", " hours", " days")):
         if not remind_in_normalized.startswith("in "):
             remind_in_normalized = "in " + remind_in_normalized
     
@@ -134,11 +139,9 @@ async def create_custom_reminder(message: str, remind_in: str, user_id=None, pho
     # Manual fallback for common time patterns that dateparser might miss
     if not reminder_time:
         print(f"[DEBUG] All dateparser strategies failed, trying manual parsing")
-        import re
         
         # Try to match common time patterns like "6pm", "6:30pm", "18:00", etc.
-        time_pattern = r'^(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$'
-        match = re.match(time_pattern, remind_in.lower().strip())
+        match = TIME_PATTERN.match(remind_in_lower)
         
         if match:
             hour = int(match.group(1))
@@ -195,8 +198,9 @@ async def create_custom_reminder(message: str, remind_in: str, user_id=None, pho
     reminder_id = str(result.inserted_id)
 
     # Instead of guna send_reminder, move send_reminder jadi consumer
-
-    enqueue_reminder_task(reminder_id, reminder_time)
+    # The Cloud Tasks client call is blocking, so keep it off the event loop
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, enqueue_reminder_task, reminder_id, reminder_time)
     
     time_until = reminder_time - now
     if time_until.days > 0:
@@ -216,16 +220,29 @@ async def create_custom_reminder(message: str, remind_in: str, user_id=None, pho
         "reminder_time": reminder_time.strftime('%Y-%m-%d %H:%M:%S %Z')
     }
 
-def  enqueue_reminder_task(reminder_id: str, reminder_time: datetime):
-    client = tasks_v2.CloudTasksClient()
+# Reminder queue configuration, resolved once at import
+REMINDER_QUEUE_PATH = tasks_v2.CloudTasksClient.queue_path(
+    os.getenv("GOOGLE_PROJECT_ID"), os.getenv("QUEUE_LOCATION"), os.getenv("QUEUE_ID")
+)
+REMINDER_HANDLER_URL = os.getenv("REMINDER_HANDLER_URL")
 
-    project = os.getenv("GOOGLE_PROJECT_ID")
-    queue = os.getenv("QUEUE_ID")
-    location = os.getenv("QUEUE_LOCATION")
-    url = os.getenv("REMINDER_HANDLER_URL")
+# Shared sync client; enqueue_reminder_task runs in executor threads, so guard creation
+_sync_client = None
+_sync_client_lock = threading.Lock()
 
-    # Construct queue path
-    parent = client.queue_path(project, location, queue)
+def _get_sync_client() -> tasks_v2.CloudTasksClient:
+    """Return the process-wide sync Cloud Tasks client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                _sync_client = tasks_v2.CloudTasksClient()
+    return _sync_client
+
+def  enqueue_reminder_task(reminder_id: str, reminder_time: datetime):
+    client = _get_sync_client()
+    parent = REMINDER_QUEUE_PATH
+    url = REMINDER_HANDLER_URL
 
     # Convert reminder_time to UTC
     reminder_time_utc = reminder_time.astimezone(pytz.UTC)
@@ -262,7 +279,7 @@ async def create_event_reminder(event_title: str, event_start_time: datetime, us
         dict: Result with status and reminder details
     """
     try:
-        tz = pytz.timezone("Asia/Kuala_Lumpur")
+        tz = KL_TZ
         now = datetime.now(tz)
         
         # Calculate reminder time (minutes before event)
@@ -293,8 +310,9 @@ async def create_event_reminder(event_title: str, event_start_time: datetime, us
         result = await reminders_collection.insert_one(reminder_data)
         reminder_id = str(result.inserted_id)
         
-        # Enqueue the reminder task
-        enqueue_reminder_task(reminder_id, reminder_time)
+        # Enqueue the reminder task (blocking Cloud Tasks call, run in executor)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, enqueue_reminder_task, reminder_id, reminder_time)
         
         print(f"✅ Event reminder created for '{event_title}' at {reminder_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
         
@@ -330,17 +348,14 @@ async def send_reminder(reminder_id: str):
         print(f"[REMINDER] Sending reminder to user {phone_number}: {message}")
         
         # Send WhatsApp message
-        loop = get_event_loop()
-        if loop:
-            asyncio.run_coroutine_threadsafe(
-                send_whatsapp_message(phone_number, message),
-                loop
-            )
+        result = await send_whatsapp_message(phone_number, message)
+        if result.get("status") != "success":
+            raise Exception(f"WhatsApp send failed: {result.get('error') or result.get('status_code')}")
         
         # Mark reminder as sent
         await reminders_collection.update_one(
             {"_id": ObjectId(reminder_id)},
-            {"$set": {"status": "sent", "sent_at": datetime.now(pytz.timezone("Asia/Kuala_Lumpur"))}}
+            {"$set": {"status": "sent", "sent_at": datetime.now(KL_TZ)}}
         )
         
         print(f"[REMINDER] Successfully sent reminder {reminder_id}")
@@ -360,7 +375,7 @@ async def list_reminders(user_id=None) -> dict:
     if user_id is None:
         raise ValueError("Missing user_id in list_reminders() call!")
     
-    now = datetime.now(pytz.timezone("Asia/Kuala_Lumpur"))
+    now = datetime.now(KL_TZ)
     
     # Get all active reminders for the user
     cursor = reminders_collection.find({
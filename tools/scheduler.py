@@ -1,24 +1,95 @@
+import io
 import json
+import logging
 import os
 import os.path
 import pytz
 import asyncio
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+from functools import lru_cache, partial
 from dotenv import load_dotenv
 from db.mongo import db  # Added db import for calendar collection
 from bson import ObjectId
+from tools.task import PRIORITY_EMOJI, STATUS_EMOJI, STATUS_TEXT
 
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logger = logging.getLogger(__name__)
+
 app_url = os.getenv("APP_URL")
 
+# Reminder timezone, resolved once at import instead of on every call
+TIMEZONE_NAME = "Asia/Kuala_Lumpur"
+KL_TZ = pytz.timezone(TIMEZONE_NAME)
+
 # MongoDB calendar collection
 calendar_collection = db["calendar"]
 
-now = datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
-today_str = now.strftime("%Y-%m-%d")
-tomorrow_str = (now + timedelta(days=1)).strftime("%Y-%m-%d")
+# Only the fields used to build reminder messages
+EVENT_REMINDER_PROJECTION = {"_id": 0, "summary": 1, "start": 1, "end": 1, "description": 1}
+
+# Only the user fields needed to address a reminder
+USER_REMINDER_PROJECTION = {"nickname": 1, "phone_number": 1}
+
+# Task statuses included in the daily reminder
+ACTIVE_TASK_STATUSES = ("pending", "in_progress")
+
+# Daily reminder slots, keyed by is_tomorrow
+REMINDER_SCHEDULES = {
+    False: {
+        "label": "[TODAY USER REMINDER]",
+        "path": "/reminder/daily/today/user",
+        "task_prefix": "today-reminder",
+        "hour": 8,
+        "minute": 30,
+        "day_offset": 0,
+    },
+    True: {
+        "label": "[TOMORROW USER REMINDER]",
+        "path": "/reminder/daily/tomorrow/user",
+        "task_prefix": "tomorrow-reminder",
+        "hour": 19,
+        "minute": 30,
+        "day_offset": 1,
+    },
+}
+
+# Static pieces of the combined reminder message
+TOMORROW_GREETING = "Hi {nickname}! Your day is wrapped up! Here's what's coming up for tomorrow:\n"
+TODAY_GREETING = "Good morning {nickname}! Here's what you have planned for today:\n"
+TOMORROW_EVENTS_HEADER = "📅 *Tomorrow's Events:*"
+TODAY_EVENTS_HEADER = "📅 *Today's Events:*"
+TASKS_HEADER = "📝 *Tasks to Focus On:*"
+
+def _format_time(value):
+    """
+    Format the clock part of an RFC3339 'YYYY-MM-DDTHH:MM...' string as
+    e.g. '9:05AM', equivalent to parsing it and calling strftime('%-I:%M%p').
+
+    Args:
+        value: RFC3339 datetime string
+
+    Returns:
+        str: 12-hour clock time
+    """
+    hour = int(value[11:13])
+    return f"{hour % 12 or 12}:{value[14:16]}{'AM' if hour < 12 else 'PM'}"
+
+@lru_cache(maxsize=32)
+def _day_bounds(target_date):
+    """
+    Compute the localized start and end of a calendar day. Every reminder for
+    the same day shares the result instead of re-localizing per user.
+
+    Args:
+        target_date: date to bound
+
+    Returns:
+        tuple: (start_of_day, end_of_day) as timezone-aware datetimes
+    """
+    start_time = KL_TZ.localize(datetime.combine(target_date, datetime.min.time()))
+    end_time = KL_TZ.localize(datetime.combine(target_date, datetime.max.time()))
+    return start_time, end_time
 
 async def get_events_for_user_on_date(user_id, target_date):
     """
@@ -31,61 +102,76 @@ async def get_events_for_user_on_date(user_id, target_date):
     """
     
     # ============ MONGODB IMPLEMENTATION ============
-    print("\n[EVENTS FETCH] user_id:", user_id)
-    print("[EVENTS FETCH] target_date:", target_date)
+    logger.debug("[EVENTS FETCH] user_id: %s, target_date: %s", user_id, target_date)
     
     try:
-        tz = pytz.timezone("Asia/Kuala_Lumpur")
-        start_time = tz.localize(datetime.combine(target_date, datetime.min.time()))
-        end_time = tz.localize(datetime.combine(target_date, datetime.max.time()))
+        start_time, end_time = _day_bounds(target_date)
         
-        # Query MongoDB for events within the date range
-        cursor = calendar_collection.find({
-            "user_id": user_id,
-            "start_time": {"$gte": start_time, "$lte": end_time}
-        }).sort("start_time", 1)  # Sort by start_time ascending
+        # Query MongoDB for events within the date range, served by the
+        # (user_id, start_time) index and projected to the fields we format
+        cursor = calendar_collection.find(
+            {
+                "user_id": user_id,
+                "start_time": {"$gte": start_time, "$lte": end_time}
+            },
+            EVENT_REMINDER_PROJECTION
+        ).sort("start_time", 1)  # Sort by start_time ascending
         
-        events = []
-        async for event in cursor:
-            events.append(event)
+        events = await cursor.to_list(length=None)
         
-        print(f"[EVENTS FETCH] {len(events)} events fetched from MongoDB.")
+        logger.debug("[EVENTS FETCH] %d events fetched from MongoDB.", len(events))
         
         # Convert MongoDB events to match Google Calendar format for compatibility
-        formatted_events = []
-        for event in events:
-            formatted_event = {
+        formatted_events = [
+            {
                 "summary": event.get("summary", "No Title"),
                 "start": event.get("start", {}),
                 "end": event.get("end", {}),
                 "description": event.get("description", "")
             }
-            formatted_events.append(formatted_event)
+            for event in events
+        ]
         
         return formatted_events, False  # Success, no token issues (MongoDB doesn't use tokens)
     
     except Exception as e:
-        print(f"[ERROR] Failed to fetch events from MongoDB for user {user_id}: {e}")
+        logger.error("[EVENTS FETCH] Failed to fetch events from MongoDB for user %s: %s", user_id, e)
         return [], False
 
+def _event_time_range(event):
+    """
+    Build the 'start - end' label for an event, or 'All-day' for date-only events.
+
+    Args:
+        event: Event dict with Google Calendar style 'start'/'end' fields
+
+    Returns:
+        str: Formatted time range
+    """
+    start_d = event["start"]
+    end_d = event["end"]
+    start = start_d.get("dateTime") or start_d.get("date")
+    end = end_d.get("dateTime") or end_d.get("date")
+
+    # All-day events only carry a date; timed ones are fixed-width RFC3339
+    # strings, so slice the clock out instead of parsing into a datetime
+    if not start or len(start) < 16 or start[10] != "T":
+        return "All-day"
+
+    try:
+        return f"{_format_time(start)} - {_format_time(end)}"
+    except (TypeError, ValueError):
+        return "All-day"
+
 async def format_event_reminder(events, date):
+    date_label = date.strftime('%A, %B %d')
     if not events:
-        return f"📅 You have no events on {date.strftime('%A, %B %d')}."
+        return f"📅 You have no events on {date_label}."
 
-    lines = [f"📅 Upcoming events on {date.strftime('%A, %B %d')}:\n"]
+    lines = [f"📅 Upcoming events on {date_label}:\n"]
+    append = lines.append
     for event in events:
-        title = event.get("summary", "No Title")
-        start = event["start"].get("dateTime", event["start"].get("date"))
-        end = event["end"].get("dateTime", event["end"].get("date"))
-
-        try:
-            start_dt = datetime.fromisoformat(start)
-            end_dt = datetime.fromisoformat(end)
-            time_range = f"{start_dt.strftime('%-I:%M%p')} - {end_dt.strftime('%-I:%M%p')}"
-        except ValueError:
-            time_range = "All-day"
-
-        lines.append(f"• {title} ({time_range})")
+        append(f"• {event.get('summary', 'No Title')} ({_event_time_range(event)})")
 
     return "\n".join(lines)
 
@@ -98,143 +184,203 @@ async def format_task_reminder(tasks):
     for task in tasks:
         title = task.get("title", "No Title")
         status = task.get("status", "pending")
-        priority = task.get("priority", "medium")
-        
-        # Priority emojis
-        priority_emoji = "🔴" if priority == "high" else "🟡" if priority == "medium" else "🟢"
-        
-        # Status emojis
-        status_emoji = "⏳" if status == "in_progress" else "📋"
-        
-        status_text = "In Progress" if status == "in_progress" else "Pending"
+        priority_emoji = PRIORITY_EMOJI.get(task.get("priority", "medium"), "🟢")
+        status_emoji = STATUS_EMOJI.get(status, "📋")
+        status_text = STATUS_TEXT.get(status, "Pending")
         lines.append(f"{status_emoji} {priority_emoji} {title} ({status_text})")
     
     return "\n".join(lines)
 
 async def format_combined_reminder(events, tasks, nickname, is_tomorrow=True):
     """Combine events and tasks into a comprehensive daily reminder"""
-    lines = []
+    buf = io.StringIO()
+    write = buf.write
     
     # Add greeting based on time of day
-    if is_tomorrow:
-        lines.append(f"Hi {nickname}! Your day is wrapped up! Here's what's coming up for tomorrow:\n")
-    else:
-        lines.append(f"Good morning {nickname}! Here's what you have planned for today:\n")
+    greeting = TOMORROW_GREETING if is_tomorrow else TODAY_GREETING
+    write(greeting.format_map({"nickname": nickname}))
+    write("\n")
     
     # Add events section
     if events:
-        event_header = "📅 *Tomorrow's Events:*" if is_tomorrow else "📅 *Today's Events:*"
-        lines.append(event_header)
+        write(TOMORROW_EVENTS_HEADER if is_tomorrow else TODAY_EVENTS_HEADER)
+        write("\n")
         for event in events:
-            title = event.get("summary", "No Title")
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-
-            try:
-                start_dt = datetime.fromisoformat(start)
-                end_dt = datetime.fromisoformat(end)
-                time_range = f"{start_dt.strftime('%-I:%M%p')} - {end_dt.strftime('%-I:%M%p')}"
-            except ValueError:
-                time_range = "All-day"
-
-            lines.append(f"• {title} ({time_range})")
-        lines.append("")  # Empty line for spacing
+            write(f"• {event.get('summary', 'No Title')} ({_event_time_range(event)})\n")
+        write("\n")  # Empty line for spacing
     
     # Add tasks section
     if tasks:
-        lines.append(f"📝 *Tasks to Focus On:*")
+        write(TASKS_HEADER)
+        write("\n")
         for task in tasks:
             title = task.get("title", "No Title")
-            status = task.get("status", "pending")
-            priority = task.get("priority", "medium")
-            
-            # Priority emojis
-            priority_emoji = "🔴" if priority == "high" else "🟡" if priority == "medium" else "🟢"
-            
-            # Status emojis
-            # status_emoji = "⏳" if status == "in_progress" else "📋"
-            
-            status_text = "In Progress" if status == "in_progress" else "Pending"
-            # lines.append(f"{status_emoji} {priority_emoji} {title} ({status_text})")
-            lines.append(f"{priority_emoji} {title} ({status_text})")
+            priority_emoji = PRIORITY_EMOJI.get(task.get("priority", "medium"), "🟢")
+            status_text = STATUS_TEXT.get(task.get("status", "pending"), "Pending")
+            write(f"{priority_emoji} {title} ({status_text})\n")
     
     # Add motivational footer
     if events or tasks:
-        footer_message = "\nHave a productive day!" if is_tomorrow else "\nLet's make today productive!"
-        lines.append(footer_message)
+        write("\nHave a productive day!" if is_tomorrow else "\nLet's make today productive!")
+    elif is_tomorrow:
+        write("🎉 You have a free day with no scheduled events or pending tasks!")
     else:
-        if is_tomorrow:
-            lines.append("🎉 You have a free day with no scheduled events or pending tasks!")
-        else:
-            lines.append("🎉 You have a free day today with no scheduled events or pending tasks!")
+        write("🎉 You have a free day today with no scheduled events or pending tasks!")
     
-    return "\n".join(lines)
+    return buf.getvalue()
+
+async def _reminder_job(user_id, is_tomorrow):
+    """
+    Send the combined events/tasks reminder for today or tomorrow to a single
+    user and reschedule the next occurrence.
+
+    Args:
+        user_id: The user's MongoDB ObjectId as a string
+        is_tomorrow: True for the evening "tomorrow" reminder, False for the morning one
+
+    Returns:
+        dict: Status payload returned by the Cloud Tasks handler
+    """
+    from utils.utils import send_whatsapp_message, decrypt_phone
+    from utils.cloud_tasks import schedule_daily_task
+    from tools.task import get_tasks
+    users_collection = db["users"]
+    schedule = REMINDER_SCHEDULES[is_tomorrow]
+    label = schedule["label"]
+
+    logger.info("%s Processing user: %s", label, user_id)
+
+    # Fetch user data
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}, USER_REMINDER_PROJECTION)
+    if not user:
+        logger.warning("%s User %s not found", label, user_id)
+        return {"status": "error", "message": "User not found"}
+
+    nickname = user.get("nickname")
+    encrypted_phone = user.get("phone_number")
+
+    # Skip user if essential data is missing
+    if not nickname or not encrypted_phone:
+        logger.warning("%s Skipping user %s due to missing data: nickname=%s, phone=%s", label, user_id, nickname, bool(encrypted_phone))
+        return {"status": "error", "message": "Missing user data"}
+
+    try:
+        decrypted_phone = decrypt_phone(encrypted_phone)
+        if not decrypted_phone:
+            logger.error("%s Failed to decrypt phone number for user %s", label, user_id)
+            return {"status": "error", "message": "Failed to decrypt phone"}
+    except Exception as decrypt_error:
+        logger.error("%s Error decrypting phone for user %s: %s", label, user_id, decrypt_error)
+        return {"status": "error", "message": str(decrypt_error)}
+
+    # Get the reminder's target date
+    target_date = (datetime.now(KL_TZ) + timedelta(days=schedule["day_offset"])).date()
+
+    # Fetch events for the target date and the user's active tasks concurrently
+    (events, token_expired), tasks = await asyncio.gather(
+        get_events_for_user_on_date(user_id, target_date),
+        get_tasks(user_id, status=ACTIVE_TASK_STATUSES),
+        return_exceptions=True
+    )
+    logger.debug("%s Found %d events for user %s, token_expired: %s", label, len(events), user_id, token_expired)
+
+    if isinstance(tasks, Exception):
+        logger.error("%s Error fetching tasks for user %s: %s", label, user_id, tasks)
+        all_active_tasks = []
+    else:
+        all_active_tasks = tasks or []
+        logger.debug("%s Found %d active tasks for user %s", label, len(all_active_tasks), user_id)
+
+    # Send combined reminder if there are events or tasks
+    async def send_reminder():
+        if not (events or all_active_tasks):
+            logger.info("%s No events or active tasks to notify for user %s", label, user_id)
+            return
+
+        message = await format_combined_reminder(events, all_active_tasks, nickname, is_tomorrow=is_tomorrow)
+        logger.debug("%s Sending combined reminder to user %s", label, user_id)
+
+        try:
+            result = await asyncio.wait_for(send_whatsapp_message(decrypted_phone, message), timeout=30)
+            logger.info("%s Combined reminder sent successfully to user %s", label, user_id)
+            if result and result.get("message_id"):
+                logger.debug("%s WhatsApp Message ID: %s", label, result["message_id"])
+        except asyncio.TimeoutError:
+            logger.error("%s Timeout error: Combined reminder sending took longer than 30 seconds", label)
+        except Exception as send_error:
+            logger.exception("%s Error sending combined reminder to user %s: %s", label, user_id, send_error)
+
+    # Reschedule the next occurrence (recurring task)
+    async def reschedule():
+        try:
+            await schedule_daily_task(**daily_reminder_spec(user_id, is_tomorrow))
+            logger.debug("%s Rescheduled next occurrence for user %s", label, user_id)
+        except Exception as reschedule_error:
+            logger.error("%s Error rescheduling task for user %s: %s", label, user_id, reschedule_error)
+
+    # The send and the reschedule are independent, so overlap their round-trips
+    await asyncio.gather(send_reminder(), reschedule())
+
+    return {"status": "success", "user_id": user_id, "message_sent": bool(events or all_active_tasks)}
+
+def daily_reminder_spec(user_id: str, is_tomorrow: bool) -> dict:
+    """Build the schedule_daily_task arguments for one of a user's daily reminders.
+
+    Args:
+        user_id: User the reminder is for
+        is_tomorrow: True for the evening "tomorrow" reminder, False for the morning one
+
+    Returns:
+        Keyword-argument dict for schedule_daily_task/schedule_daily_tasks
+    """
+    schedule = REMINDER_SCHEDULES[is_tomorrow]
+    return {
+        "endpoint_url": f"{app_url}{schedule['path']}",
+        "task_name": f"{schedule['task_prefix']}-{user_id}",
+        "hour": schedule["hour"],
+        "minute": schedule["minute"],
+        "timezone_str": TIMEZONE_NAME,
+        "request_body": {"user_id": user_id},
+    }
+
+def daily_reminder_specs(user_id: str) -> list:
+    """Both daily reminder specs for a user (today's, then tomorrow's)."""
+    return [daily_reminder_spec(user_id, is_tomorrow) for is_tomorrow in (False, True)]
+
+today_reminder_job = partial(_reminder_job, is_tomorrow=False)
+tomorrow_reminder_job = partial(_reminder_job, is_tomorrow=True)
 
 async def start_scheduler():
     """
     Initialize Cloud Tasks for daily reminders.
     Creates individual recurring tasks for each user in the database.
     """
-    from utils.cloud_tasks import schedule_daily_task
+    from utils.cloud_tasks import schedule_daily_tasks
     from db.mongo import db
     users_collection = db["users"]
     
     # Fetch all users from the database
-    users_cursor = users_collection.find({})
+    users_cursor = users_collection.find({}, {"_id": 1})
     users = await users_cursor.to_list(length=None)
     
     if not users:
-        print("⚠️ No users found in database. Skipping scheduler initialization.")
+        logger.warning("No users found in database. Skipping scheduler initialization.")
         return
     
-    print(f"\n📋 Found {len(users)} users. Scheduling daily reminders...")
+    logger.info("Found %d users. Scheduling daily reminders...", len(users))
     
-    # Schedule daily reminders using Cloud Tasks
-    today_count = 0
-    tomorrow_count = 0
+    # One spec per (user, reminder slot); all scheduled concurrently over the shared client
+    slots = [(str(user["_id"]), is_tomorrow) for user in users for is_tomorrow in (False, True)]
+    results = await schedule_daily_tasks([daily_reminder_spec(*slot) for slot in slots])
     
-    try:
-        for user in users:
-            user_id = str(user.get('_id'))
-            if not user_id:
-                print(f"⚠️ Skipping user without user_id: {user_id}")
-                continue
-            
-            # Schedule today's reminder at 8:30 AM for this user
-            today_url = f"{app_url}/reminder/daily/today/user"
-            try:
-                await schedule_daily_task(
-                    endpoint_url=today_url,
-                    task_name=f"today-reminder-{user_id}",
-                    hour=8,
-                    minute=30,
-                    timezone_str="Asia/Kuala_Lumpur",
-                    request_body={"user_id": user_id}
-                )
-                today_count += 1
-            except Exception as e:
-                print(f"❌ Failed to schedule today's task for user {user_id}: {e}")
-            
-            # Schedule tomorrow's reminder at 7:30 PM for this user
-            tomorrow_url = f"{app_url}/reminder/daily/tomorrow/user"
-            try:
-                await schedule_daily_task(
-                    endpoint_url=tomorrow_url,
-                    task_name=f"tomorrow-reminder-{user_id}",
-                    hour=19,
-                    minute=30,
-                    timezone_str="Asia/Kuala_Lumpur",
-                    request_body={"user_id": user_id}
-                )
-                tomorrow_count += 1
-            except Exception as e:
-                print(f"❌ Failed to schedule tomorrow's task for user {user_id}: {e}")
-        
-        print("\n✅ Cloud Tasks scheduler initialized with:")
-        print(f"   • {today_count} Today's reminders at 8:30 AM")
-        print(f"   • {tomorrow_count} Tomorrow's reminders at 7:30 PM")
-    except Exception as e:
-        print(f"❌ Failed to schedule daily tasks: {e}")
-        raise
+    counts = {False: 0, True: 0}
+    for (user_id, is_tomorrow), result in zip(slots, results):
+        if isinstance(result, Exception):
+            logger.error("%s Failed to schedule task for user %s: %s", REMINDER_SCHEDULES[is_tomorrow]["label"], user_id, result)
+        else:
+            counts[is_tomorrow] += 1
     
-    print("✅ Cloud Tasks scheduler initialized successfully")
\ No newline at end of file
+    logger.info(
+        "Cloud Tasks scheduler initialized with %d today's reminders at 8:30 AM and %d tomorrow's reminders at 7:30 PM",
+        counts[False], counts[True]
+    )
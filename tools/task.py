@@ -1,6 +1,10 @@
 from datetime import datetime
+import asyncio
+import logging
 import pytz
+import re
 import uuid
+from pymongo import ReturnDocument
 from db.mongo import client
 from dotenv import load_dotenv
 import os
@@ -8,154 +12,222 @@ import os
 # Task collection setup
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logger = logging.getLogger(__name__)
+
+KL_TZ = pytz.timezone("Asia/Kuala_Lumpur")
+
 db_name = os.environ.get("DB_NAME")
 db = client[db_name]
-task_list_collection = db["task_list"]
+# One document per task: {user_id, task_id, title, description, priority, status, created_at, updated_at}
+# (replaces the per-user embedded "task_list" array; see migrate_tasks.py)
+tasks_collection = db["tasks"]
+
+# Fields returned to callers (internal ids stay server-side)
+TASK_PROJECTION = {"_id": 0, "user_id": 0}
+
+# Number of most recently updated completed tasks returned by get_tasks()
+COMPLETED_TASKS_LIMIT = 5
+
+# Display mappings for task priority/status, shared by replies and reminders
+PRIORITY_EMOJI = {"high": "🔴", "medium": "🟡", "low": "🟢"}
+STATUS_EMOJI = {"in_progress": "⏳", "pending": "📋"}
+STATUS_TEXT = {"in_progress": "In Progress", "pending": "Pending"}
+
+# Index creation runs from the FastAPI lifespan in main.py
+async def init_task_indexes():
+    """Initialize tasks collection indexes"""
+    try:
+        await tasks_collection.create_index([("user_id", 1), ("task_id", 1)], unique=True)
+        await tasks_collection.create_index([("user_id", 1), ("status", 1), ("updated_at", -1)])
+        await tasks_collection.create_index([("user_id", 1), ("created_at", 1)])
+        logger.info("✅ Created indexes on tasks collection")
+    except Exception as e:
+        logger.warning("⚠️ Task index creation failed (might already exist): %s", e)
 
 class AuthRequiredError(Exception):
     pass
 
-async def create_task(title: str = None, priority: str = "medium", user_id=None, description: str = None) -> dict:
-    if user_id is None:
-        raise ValueError("Missing user_id in create_task() call!")
-    
-    print("Creating task for user_id:", user_id, type(user_id))
-    
+def _build_task(title: str, priority: str, description: str, now: datetime) -> dict:
+    """Build a new pending task document.
+
+    Args:
+        title: Task title
+        priority: 'high', 'medium' or 'low' (anything else falls back to medium)
+        description: Optional task details
+        now: Timestamp used for created_at/updated_at
+
+    Returns:
+        Task dict without user_id
+    """
     # Validate priority
-    valid_priorities = ["high", "medium", "low"]
-    if priority not in valid_priorities:
+    if priority not in PRIORITY_EMOJI:
         priority = "medium"  # Default fallback
     
-    # Create task object
-    tz = pytz.timezone("Asia/Kuala_Lumpur")
-    now = datetime.now(tz)
-    
-    task = {
+    return {
         'task_id': str(uuid.uuid4()),  # Unique task ID
         'title': title,
         'description': description or "",
         'priority': priority,
         'status': 'pending',
-        'created_at': now
+        'created_at': now,
+        'updated_at': now
     }
+
+async def create_task(title: str = None, priority: str = "medium", user_id=None, description: str = None) -> dict:
+    if user_id is None:
+        raise ValueError("Missing user_id in create_task() call!")
     
-    print("Task object:", task)
+    logger.debug("Creating task for user_id: %s", user_id)
     
-    # Update user document - add task to tasks array
-    result = await task_list_collection.update_one(
-        {"user_id": user_id},
-        {
-            "$push": {"tasks": task},
-            "$set": {"updated_at": now}
-        },
-        upsert=True  # Create document if it doesn't exist
-    )
+    # Create task object
+    task = _build_task(title, priority, description, datetime.now(KL_TZ))
+    
+    logger.debug("Task object: %s", task)
+    
+    # Insert the task as its own document (copy so the returned dict has no _id)
+    result = await tasks_collection.insert_one({**task, "user_id": user_id})
     
-    print(f'Task added to user {user_id} - Modified: {result.modified_count}, Upserted: {result.upserted_id}')
+    logger.debug("Task added to user %s - Inserted: %s", user_id, result.inserted_id)
     return task
 
-async def get_tasks(user_id: str, status: str = None, priority: str = None) -> list:
-    """Get all tasks for a user, optionally filtered by status and/or priority.
-    If status is 'completed', return only the latest 5 completed tasks.
-    If no status is given, return all tasks but limit completed ones to latest 5.
+async def create_tasks(tasks: list, user_id=None) -> list:
+    """Create several tasks for a user in a single insert_many round trip.
+
+    Args:
+        tasks: List of dicts with 'title' and optional 'priority'/'description'
+        user_id: Owner of the tasks
+
+    Returns:
+        List of created task dicts, in the order given
     """
+    if user_id is None:
+        raise ValueError("Missing user_id in create_tasks() call!")
+    if not tasks:
+        return []
     
-    print("Getting tasks for user_id:", user_id)
+    logger.debug("Creating %d tasks for user_id: %s", len(tasks), user_id)
     
-    user_doc = await task_list_collection.find_one({"user_id": user_id})
+    now = datetime.now(KL_TZ)
+    created = [
+        _build_task(t.get("title"), t.get("priority", "medium"), t.get("description"), now)
+        for t in tasks
+    ]
     
-    if not user_doc or "tasks" not in user_doc:
-        print(f"No tasks found for user {user_id}")
-        return []
+    # Unordered so one bad document doesn't block the rest of the batch
+    result = await tasks_collection.insert_many(
+        [{**task, "user_id": user_id} for task in created],
+        ordered=False
+    )
     
-    tasks = user_doc["tasks"]
+    logger.debug("%d tasks added to user %s", len(result.inserted_ids), user_id)
+    return created
 
-    # Apply priority filter first if given
+async def get_tasks(user_id: str, status=None, priority: str = None) -> list:
+    """Get all tasks for a user, optionally filtered by status and/or priority.
+    status may be a single status or a list/tuple of statuses (returned grouped in that order).
+    If status is 'completed', return only the latest 5 completed tasks.
+    If no status is given, return all tasks but limit completed ones to latest 5.
+    """
+    
+    logger.debug("Getting tasks for user_id: %s", user_id)
+    
+    query = {"user_id": user_id}
     if priority:
-        tasks = [task for task in tasks if task.get("priority") == priority]
-
-    if status:
-        # Filter and possibly limit completed tasks
-        tasks = [task for task in tasks if task.get("status") == status]
-        if status == "completed":
-            tasks.sort(key=lambda task: task.get("updated_at") or task.get("created_at") or "", reverse=True)
-            tasks = tasks[:5]
+        query["priority"] = priority
+    
+    if status == "completed":
+        tasks = await _find_latest_completed(query)
+    elif status:
+        statuses = list(status) if isinstance(status, (list, tuple)) else [status]
+        tasks = await _find_active(query, statuses)
     else:
-        # Group tasks by status
-        pending = [task for task in tasks if task.get("status") == "pending"]
-        in_progress = [task for task in tasks if task.get("status") == "in_progress"]
-        completed = [task for task in tasks if task.get("status") == "completed"]
-        
-        # Limit completed tasks to latest 5
-        completed.sort(key=lambda task: task.get("updated_at") or task.get("created_at") or "", reverse=True)
-        completed = completed[:5]
-
-        tasks = pending + in_progress + completed
-
-    print(f"Returning {len(tasks)} tasks for user {user_id}")
+        # Open tasks in creation order, plus the latest completed ones
+        active, completed = await asyncio.gather(
+            _find_active(query, ["pending", "in_progress"]),
+            _find_latest_completed(query)
+        )
+        tasks = active + completed
+
+    logger.debug("Returning %d tasks for user %s", len(tasks), user_id)
     return tasks
 
+async def _find_active(query: dict, statuses: list) -> list:
+    """Fetch tasks in the given statuses, grouped in that order and oldest first within a status.
+
+    Args:
+        query: Base filter (user_id and optional priority)
+        statuses: Statuses to include, in the order they should be returned
+
+    Returns:
+        List of task dicts
+    """
+    cursor = tasks_collection.find(
+        {**query, "status": {"$in": statuses}}, TASK_PROJECTION
+    ).sort("created_at", 1)
+    tasks = await cursor.to_list(length=None)
+    if len(statuses) == 1:
+        return tasks
+    
+    # Bucket in one pass; appending keeps creation order within each status
+    buckets = {s: [] for s in statuses}
+    for task in tasks:
+        buckets[task.get("status")].append(task)
+    return [task for s in statuses for task in buckets[s]]
+
+async def _find_latest_completed(query: dict) -> list:
+    """Fetch the most recently updated completed tasks.
+
+    Args:
+        query: Base filter (user_id and optional priority)
+
+    Returns:
+        List of at most COMPLETED_TASKS_LIMIT task dicts, newest first
+    """
+    cursor = tasks_collection.find(
+        {**query, "status": "completed"}, TASK_PROJECTION
+    ).sort("updated_at", -1).limit(COMPLETED_TASKS_LIMIT)
+    return await cursor.to_list(length=None)
+
 
 async def update_task_status(task_id: str = None, task_title: str = None, status: str = None, user_id: str = None) -> dict:
     """Update the status of a specific task by task_id or task_title"""
-    print(f"Updating task status to {status} for user {user_id}")
+    logger.debug("Updating task status to %s for user %s", status, user_id)
     
     # Validate status
     valid_statuses = ["pending", "in_progress", "completed"]
     if status not in valid_statuses:
-        print(f"Invalid status: {status}. Valid options: {valid_statuses}")
+        logger.warning("Invalid status: %s. Valid options: %s", status, valid_statuses)
         return None
     
     if user_id is None:
         raise ValueError("Missing user_id in update_task_status() call!")
     
-    # Find user document first
-    user_doc = await task_list_collection.find_one({"user_id": user_id})
-    if not user_doc or "tasks" not in user_doc:
-        print(f"No tasks found for user {user_id}")
+    # Match the task server-side and update it in place
+    task_filter = {"user_id": user_id}
+    if task_id:
+        task_filter["task_id"] = task_id
+    elif task_title:
+        task_filter["title"] = {"$regex": re.escape(task_title), "$options": "i"}
+    else:
+        logger.warning("No task_id or task_title given for user %s", user_id)
         return None
     
-    # Find the task to update
-    task_to_update = None
-    task_index = None
-    
-    for i, task in enumerate(user_doc["tasks"]):
-        if task_id and task.get("task_id") == task_id:
-            task_to_update = task
-            task_index = i
-            break
-        elif task_title and task_title.lower() in task.get("title", "").lower():
-            task_to_update = task
-            task_index = i
-            break
-    
-    if not task_to_update:
-        print(f"Task not found for user {user_id}")
-        return None
+    now = datetime.now(KL_TZ)
     
-    tz = pytz.timezone("Asia/Kuala_Lumpur")
-    now = datetime.now(tz)
-    
-    # Update specific task in the array using array index
-    result = await task_list_collection.update_one(
-        {"user_id": user_id},
-        {
-            "$set": {
-                f"tasks.{task_index}.status": status,
-                f"tasks.{task_index}.updated_at": now,
-                "updated_at": now
-            }
-        }
+    # Oldest match first, the same task the embedded-array scan used to pick
+    updated_task = await tasks_collection.find_one_and_update(
+        task_filter,
+        {"$set": {"status": status, "updated_at": now}},
+        projection=TASK_PROJECTION,
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.modified_count > 0:
-        print(f"Task updated successfully")
-        # Return the updated task
-        task_to_update["status"] = status
-        task_to_update["updated_at"] = now
-        return task_to_update
+    if updated_task:
+        logger.debug("Task updated successfully")
+        return updated_task
     else:
-        print(f"Task update failed")
+        logger.debug("Task not found for user %s", user_id)
         return None
 
 create_task_tool = {
@@ -2,20 +2,97 @@
 Cloud Tasks utility functions for scheduling recurring and one-time tasks.
 """
 import os
-import json
+import asyncio
+import logging
+import orjson
 import hashlib
-from datetime import datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional
+import time
+from datetime import datetime, timedelta, timezone
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import tasks_v2
+from google.protobuf.timestamp_pb2 import Timestamp
 import pytz
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=".env.local", override=True)
 
+logger = logging.getLogger(__name__)
+
 # Check if running in Cloud Run
 IN_CLOUD_RUN = bool(os.getenv("K_SERVICE"))  # K_SERVICE is automatically set in Cloud Run
 
+DEFAULT_TIMEZONE = "Asia/Kuala_Lumpur"
+KL_TZ = pytz.timezone(DEFAULT_TIMEZONE)
+_UTC = timezone.utc  # stdlib singleton; cheaper than pytz.UTC for now()
+# Malaysia has no DST, so the default timezone is a fixed UTC+8
+KL_UTC_OFFSET_SECONDS = 8 * 3600
+SECONDS_PER_DAY = 86400
+
+# Upper bound on concurrent create_task calls in schedule_daily_tasks()
+SCHEDULE_CONCURRENCY = int(os.getenv("CLOUD_TASKS_SCHEDULE_CONCURRENCY", "50"))
+# Default upper bound on concurrent create_task calls in enqueue_announcements_bulk()
+ANNOUNCEMENT_CONCURRENCY = int(os.getenv("CLOUD_TASKS_ANNOUNCEMENT_CONCURRENCY", "50"))
+
+# Queue and endpoint configuration, resolved once at import
+_PROJECT = os.getenv("GOOGLE_PROJECT_ID")
+_LOCATION = os.getenv("QUEUE_LOCATION")
+_APP_URL = os.getenv("APP_URL")
+_PARENT_DEFAULT = tasks_v2.CloudTasksAsyncClient.queue_path(_PROJECT, _LOCATION, os.getenv("QUEUE_ID"))
+_PARENT_ASSISTANT = tasks_v2.CloudTasksAsyncClient.queue_path(_PROJECT, _LOCATION, "assistant-queue")  # Dedicated queue for assistant messages
+_PARENT_ANNOUNCEMENT = tasks_v2.CloudTasksAsyncClient.queue_path(_PROJECT, _LOCATION, "announcement-queue")
+_WORKER_URL = f"{_APP_URL}/worker/process-message"
+_ANNOUNCE_URL = f"{_APP_URL}/send/announcement"
+
+# WhatsApp message ids enqueued recently by this instance; catches webhook retries
+# before the Cloud Tasks round trip (the named task still dedups across instances)
+SEEN_MESSAGES_CACHE_SIZE = int(os.getenv("SEEN_MESSAGES_CACHE_SIZE", "50000"))
+SEEN_MESSAGES_CACHE_TTL = int(os.getenv("SEEN_MESSAGES_CACHE_TTL", "600"))  # 10 minutes default
+_seen_messages = TTLCache(maxsize=SEEN_MESSAGES_CACHE_SIZE, ttl=SEEN_MESSAGES_CACHE_TTL)
+
+# Static request pieces shared by every task
+_SCHEDULED_BODY = orjson.dumps({"scheduled": True})
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Shared client so every enqueue reuses one warm gRPC channel
+_CT_CLIENT: Optional[tasks_v2.CloudTasksAsyncClient] = None
+
+
+def _client() -> tasks_v2.CloudTasksAsyncClient:
+    """Return the process-wide Cloud Tasks client, creating it on first use."""
+    global _CT_CLIENT
+    if _CT_CLIENT is None:
+        _CT_CLIENT = tasks_v2.CloudTasksAsyncClient()
+    return _CT_CLIENT
+
+
+@lru_cache(maxsize=32)
+def _tz(name: str):
+    """Resolve a timezone name to its pytz tzinfo once per process."""
+    return pytz.timezone(name)
+
 
-async def schedule_daily_task(endpoint_url: str, task_name: str, hour: int, minute: int, timezone_str: str = "Asia/Kuala_Lumpur", request_body: dict = None):
+def _next_hhmm_epoch(hour: int, minute: int, tz_offset_seconds: int) -> int:
+    """Return the unix time of the next HH:MM in a fixed-offset timezone.
+
+    Args:
+        hour: Hour of the day (0-23) in local time
+        minute: Minute of the hour (0-59)
+        tz_offset_seconds: Local offset from UTC in seconds
+
+    Returns:
+        Epoch seconds of the next occurrence (tomorrow if already passed today)
+    """
+    local_now = int(time.time()) + tz_offset_seconds
+    target = local_now - local_now % SECONDS_PER_DAY + hour * 3600 + minute * 60
+    if target <= local_now:
+        target += SECONDS_PER_DAY
+    return target - tz_offset_seconds
+
+
+async def schedule_daily_task(endpoint_url: str, task_name: str, hour: int, minute: int, timezone_str: str = DEFAULT_TIMEZONE, request_body: dict = None):
     """
     Schedule a recurring daily task using Cloud Tasks.
     
@@ -32,71 +109,88 @@ async def schedule_daily_task(endpoint_url: str, task_name: str, hour: int, minu
         request_body: Optional custom request body dict (e.g., {"user_id": "123"})
     
     Returns:
-        Task response from Cloud Tasks
+        Task response from Cloud Tasks, or None if this slot was already scheduled
     """
-    client = tasks_v2.CloudTasksAsyncClient()
-    
-    project = os.getenv("GOOGLE_PROJECT_ID")
-    queue = os.getenv("QUEUE_ID")
-    location = os.getenv("QUEUE_LOCATION")
-    
-    # Construct queue path
-    parent = client.queue_path(project, location, queue)
+    client = _client()
+    parent = _PARENT_DEFAULT
     
     # Calculate next occurrence
-    tz = pytz.timezone(timezone_str)
-    now = datetime.now(tz)
-    
-    # Create datetime for today at the specified time
-    target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if timezone_str == DEFAULT_TIMEZONE:
+        next_epoch = _next_hhmm_epoch(hour, minute, KL_UTC_OFFSET_SECONDS)
+        tz_offset_seconds = KL_UTC_OFFSET_SECONDS
+    else:
+        # Zones with DST need a real conversion
+        tz = _tz(timezone_str)
+        now = datetime.now(tz)
+        today = now.date()
+        # Localize the naive wall-clock target once (replace() on a pytz-aware
+        # datetime keeps now's offset, which is wrong across a DST change)
+        target_time = tz.localize(datetime(today.year, today.month, today.day, hour, minute))
+        
+        # If the time has already passed today, schedule for tomorrow
+        if target_time <= now:
+            tomorrow = today + timedelta(days=1)
+            target_time = tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, hour, minute))
+        next_epoch = int(target_time.timestamp())
+        tz_offset_seconds = int(target_time.utcoffset().total_seconds())
     
-    # If the time has already passed today, schedule for tomorrow
-    if target_time <= now:
-        target_time = target_time + timedelta(days=1)
+    # Local wall-clock time, for logging only
+    scheduled_for = None
+    if logger.isEnabledFor(logging.INFO):
+        scheduled_for = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(next_epoch + tz_offset_seconds)) + f" {timezone_str}"
     
-    # Convert to UTC for Cloud Tasks
-    target_time_utc = target_time.astimezone(pytz.UTC)
+    # Use custom request body or the pre-encoded default
+    body = orjson.dumps(request_body) if request_body else _SCHEDULED_BODY
     
-    # Use custom request body or default
-    body_data = request_body if request_body else {"scheduled": True}
+    # Deterministic name per schedule slot: a retry or duplicate reschedule for the
+    # same slot collides with the existing task instead of creating a second one
+    slot = time.strftime("%Y%m%d%H%M", time.gmtime(next_epoch))
     
     # Build task
     task = {
+        "name": f"{parent}/tasks/{task_name}-{slot}",
         "http_request": {
             "http_method": tasks_v2.HttpMethod.POST,
             "url": endpoint_url,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body_data).encode(),
+            "headers": _JSON_HEADERS,
+            "body": body,
         },
-        "schedule_time": target_time_utc
+        "schedule_time": Timestamp(seconds=next_epoch)
     }
     
     try:
         # Try to create the task
         response = await client.create_task(request={"parent": parent, "task": task})
-        print(f"✅ Daily task '{task_name}' scheduled for {target_time.strftime('%Y-%m-%d %H:%M:%S %Z')} — Task: {response.name}")
+        logger.info("✅ Daily task '%s' scheduled for %s — Task: %s", task_name, scheduled_for, response.name)
         return response
+    except AlreadyExists:
+        # This slot is already scheduled, nothing to do
+        logger.info("⚠️ Task '%s' already scheduled for %s — Skipping", task_name, scheduled_for)
+        return None
     except Exception as e:
-        # If task already exists, delete and recreate
-        if "ALREADY_EXISTS" in str(e):
-            print(f"⚠️ Task '{task_name}' already exists, deleting and recreating...")
-            try:
-                await client.delete_task(name=task["name"])
-                print(f"✅ Deleted existing task '{task_name}'")
-                # Recreate without the name field to let Cloud Tasks generate a new one
-                task_without_name = {
-                    "http_request": task["http_request"],
-                    "schedule_time": task["schedule_time"]
-                }
-                response = await client.create_task(request={"parent": parent, "task": task_without_name})
-                print(f"✅ Daily task '{task_name}' rescheduled for {target_time.strftime('%Y-%m-%d %H:%M:%S %Z')} — Task: {response.name}")
-                return response
-            except Exception as delete_error:
-                print(f"❌ Failed to delete and recreate task '{task_name}': {delete_error}")
-                raise
-        else:
-            print(f"❌ Failed to schedule daily task '{task_name}': {e}")
-            raise
+        logger.error("❌ Failed to schedule daily task '%s': %s", task_name, e)
+        raise
+
+
+async def schedule_daily_tasks(specs: list) -> list:
+    """
+    Schedule several recurring daily tasks concurrently over the shared client.
+    
+    Args:
+        specs: List of keyword-argument dicts for schedule_daily_task
+               (endpoint_url, task_name, hour, minute, timezone_str, request_body)
+    
+    Returns:
+        List with one entry per spec, in order: the Cloud Tasks response,
+        or the exception raised while scheduling it
+    """
+    semaphore = asyncio.Semaphore(SCHEDULE_CONCURRENCY)
+    
+    async def schedule(spec):
+        async with semaphore:
+            return await schedule_daily_task(**spec)
+    
+    return await asyncio.gather(*(schedule(spec) for spec in specs), return_exceptions=True)
 
 
 async def enqueue_message(sender: str, text: str, message_id: str = None):
@@ -114,58 +208,85 @@ async def enqueue_message(sender: str, text: str, message_id: str = None):
     Returns:
         Task response from Cloud Tasks
     """
-    client = tasks_v2.CloudTasksAsyncClient()
-    
-    project = os.getenv("GOOGLE_PROJECT_ID")
-    queue_id = "assistant-queue"  # Dedicated queue for assistant messages
-    location = os.getenv("QUEUE_LOCATION")
-    app_url = os.getenv("APP_URL")
-    
-    # Construct queue path
-    parent = client.queue_path(project, location, queue_id)
+    if message_id:
+        if message_id in _seen_messages:
+            logger.info("⚠️ Duplicate message detected (message_id: %s) — Skipping", message_id)
+            return None
+        _seen_messages[message_id] = True
     
-    # Worker endpoint URL
-    endpoint_url = f"{app_url}/worker/process-message"
+    client = _client()
+    parent = _PARENT_ASSISTANT
+    endpoint_url = _WORKER_URL
     
     # Request body with message data
     body_data = {
         "sender": sender,
         "text": text,
         "message_id": message_id,
-        "timestamp": datetime.now(pytz.UTC).isoformat()
+        "timestamp": datetime.now(_UTC).isoformat()
     }
     
     # Create task name with deduplication
-    # Use message_id if available, otherwise generate from sender+text+timestamp
+    # Use message_id if available, otherwise generate from sender+text+timestamp.
+    # Either way the key is hashed: WhatsApp ids contain characters ('.', '=')
+    # that aren't allowed in Cloud Tasks task ids.
+    h = hashlib.blake2b(digest_size=8)
     if message_id:
-        task_id = f"msg-{message_id}"
+        h.update(message_id.encode())
     else:
-        # Generate deterministic ID from content for deduplication
-        content_hash = hashlib.md5(f"{sender}-{text}-{datetime.now(pytz.UTC).timestamp()}".encode()).hexdigest()[:16]
-        task_id = f"msg-{content_hash}"
+        h.update(sender.encode())
+        h.update(b"\x1f")
+        h.update(text.encode())
+        h.update(b"\x1f")
+        h.update(body_data["timestamp"].encode())
+    task_id = f"msg-{h.hexdigest()}"
     
-    # Build task
+    # Build task (named, so Cloud Tasks rejects a redelivered webhook for the same message)
     task = {
+        "name": f"{parent}/tasks/{task_id}",
         "http_request": {
             "http_method": tasks_v2.HttpMethod.POST,
             "url": endpoint_url,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body_data).encode(),
+            "headers": _JSON_HEADERS,
+            "body": orjson.dumps(body_data),
         }
     }
     
     try:
         # Create task (executes immediately if no schedule_time is set)
         response = await client.create_task(request={"parent": parent, "task": task})
-        print(f"✅ Message queued for processing — Task: {response.name}")
+        logger.info("✅ Message queued for processing — Task: %s", response.name)
         return response
+    except AlreadyExists:
+        logger.info("⚠️ Duplicate message detected (task_id: %s) — Skipping", task_id)
+        return None
     except Exception as e:
-        if "ALREADY_EXISTS" in str(e):
-            print(f"⚠️ Duplicate message detected (task_id: {task_id}) — Skipping")
-            return None
-        else:
-            print(f"❌ Failed to enqueue message: {e}")
-            raise
+        logger.error("❌ Failed to enqueue message: %s", e)
+        if message_id:
+            # Let WhatsApp's retry through since nothing was queued
+            _seen_messages.pop(message_id, None)
+        raise
+
+
+def _announcement_task(phone_number: str, announcement: str, use_template: bool, template_name: str, timestamp: str) -> dict:
+    """Build the Cloud Tasks task dict for one announcement recipient."""
+    # Request body with announcement data
+    body_data = {
+        "phone_number": phone_number,
+        "announcement": announcement,
+        "use_template": use_template,
+        "template_name": template_name,
+        "timestamp": timestamp
+    }
+    
+    return {
+        "http_request": {
+            "http_method": tasks_v2.HttpMethod.POST,
+            "url": _ANNOUNCE_URL,
+            "headers": _JSON_HEADERS,
+            "body": orjson.dumps(body_data),
+        }
+    }
 
 
 async def enqueue_announcement(phone_number: str, announcement: str = "", use_template: bool = False, template_name: str = None):
@@ -184,43 +305,47 @@ async def enqueue_announcement(phone_number: str, announcement: str = "", use_te
     Returns:
         Task response from Cloud Tasks
     """
-    client = tasks_v2.CloudTasksAsyncClient()
-    
-    project = os.getenv("GOOGLE_PROJECT_ID")
-    queue_id = "announcement-queue" 
-    location = os.getenv("QUEUE_LOCATION")
-    app_url = os.getenv("APP_URL")
-    
-    # Construct queue path
-    parent = client.queue_path(project, location, queue_id)
-    
-    # Worker endpoint URL
-    endpoint_url = f"{app_url}/send/announcement"
-    
-    # Request body with announcement data
-    body_data = {
-        "phone_number": phone_number,
-        "announcement": announcement,
-        "use_template": use_template,
-        "template_name": template_name,
-        "timestamp": datetime.now(pytz.UTC).isoformat()
-    }
-    
-    # Build task
-    task = {
-        "http_request": {
-            "http_method": tasks_v2.HttpMethod.POST,
-            "url": endpoint_url,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body_data).encode(),
-        }
-    }
+    client = _client()
+    task = _announcement_task(phone_number, announcement, use_template, template_name, datetime.now(_UTC).isoformat())
     
     try:
         # Create task (executes immediately if no schedule_time is set)
-        response = await client.create_task(request={"parent": parent, "task": task})
-        print(f"✅ Announcement queued for {phone_number[:5]}**** — Task: {response.name}")
+        response = await client.create_task(request={"parent": _PARENT_ANNOUNCEMENT, "task": task})
+        logger.info("✅ Announcement queued for %s**** — Task: %s", phone_number[:5], response.name)
         return response
     except Exception as e:
-        print(f"❌ Failed to enqueue announcement for {phone_number[:5]}****: {e}")
-        raise
\ No newline at end of file
+        logger.error("❌ Failed to enqueue announcement for %s****: %s", phone_number[:5], e)
+        raise
+
+
+async def enqueue_announcements_bulk(phone_numbers: list, announcement: str = "", use_template: bool = False, template_name: str = None, concurrency: int = ANNOUNCEMENT_CONCURRENCY) -> list:
+    """
+    Enqueue the same announcement for many recipients concurrently.
+    
+    Args:
+        phone_numbers: Decrypted phone numbers to send to
+        announcement: Message text content (for free-form messages)
+        use_template: Whether to use a WhatsApp template
+        template_name: Template name if use_template=True
+        concurrency: Maximum number of create_task calls in flight
+    
+    Returns:
+        List with one entry per phone number, in order: the Cloud Tasks
+        response, or the exception raised while enqueueing it
+    """
+    client = _client()
+    timestamp = datetime.now(_UTC).isoformat()
+    tasks = [
+        _announcement_task(phone_number, announcement, use_template, template_name, timestamp)
+        for phone_number in phone_numbers
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def enqueue(task):
+        async with semaphore:
+            return await client.create_task(request={"parent": _PARENT_ANNOUNCEMENT, "task": task})
+    
+    results = await asyncio.gather(*(enqueue(task) for task in tasks), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    logger.info("✅ Announcement queued for %d/%d recipients", len(results) - failed, len(results))
+    return results
@@ -1,126 +1,395 @@
+import base64
 import hashlib
-from fastapi import Depends, HTTPException, logger
+from fastapi import Depends, HTTPException
 import httpx
+import logging
 import os
+import random
 import json
+import orjson
 import asyncio
-import threading
-from jose import jwt
+import time
+from functools import lru_cache
+import jwt
+from jwt import ExpiredSignatureError, InvalidTokenError
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from dotenv import load_dotenv
 from google_auth_oauthlib.flow import Flow
-from datetime import datetime, timedelta
-import pytz
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from datetime import datetime, timedelta, timezone, time as dt_time
+from zoneinfo import ZoneInfo
 from db.mongo import oauth_states_collection, oauth_tokens_collection
-from cryptography.fernet import Fernet
-import dateparser
+from cryptography.fernet import Fernet, InvalidToken
+from cachetools import TTLCache
 
 load_dotenv(dotenv_path=".env.local", override=True)  # Make sure environment variables are loaded
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables with logging
-print(f"\n{'='*80}")
-print(f"[INIT] Loading environment variables...")
+logger.info("[INIT] Loading environment variables...")
 SCOPES = json.loads(os.getenv("SCOPES", "[]"))
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 APP_URL = os.getenv("APP_URL")
 SECRET_KEY = os.getenv("TOKEN_SECRET_KEY")
 ALGORITHM = "HS256"
+# Prepared HMAC key so jwt.decode doesn't re-derive it from the secret on every call
+JWT_DECODE_KEY = jwt.PyJWK({
+    "kty": "oct",
+    "alg": ALGORITHM,
+    "k": base64.urlsafe_b64encode(SECRET_KEY.encode()).rstrip(b"=").decode("ascii")
+}) if SECRET_KEY else SECRET_KEY
 fernet = Fernet(os.getenv("PHONE_ENCRYPTION_KEY"))
+KL_TZ = ZoneInfo("Asia/Kuala_Lumpur")
 
 security = HTTPBearer()
 
 redirect_uri = f"{APP_URL}/auth/google_callback"
 
+# Per-user Google auth URL cache of (auth_url, state). oauth_states holds one state per
+# user and another worker may have replaced it, so a hit is only served after checking
+# the state is still current. OAUTH_STATE_TTL (db.mongo) must be longer than this TTL
+AUTH_URL_CACHE_SIZE = int(os.getenv("AUTH_URL_CACHE_SIZE", "4096"))
+AUTH_URL_CACHE_TTL = int(os.getenv("AUTH_URL_CACHE_TTL", "600"))  # 10 minutes default
+auth_url_cache = TTLCache(maxsize=AUTH_URL_CACHE_SIZE, ttl=AUTH_URL_CACHE_TTL)
+
+# Verified JWT payloads keyed by cache_key() of the token; entries are only served
+# while the token's own exp is more than JWT_EXPIRY_LEEWAY seconds away
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "900"))  # 15 minutes default
+JWT_EXPIRY_LEEWAY = 5
+jwt_payload_cache = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL)
+
+# Dashboard event query: timezone used for server-side formatting, and a cap on upcoming events
+DASHBOARD_EVENTS_TZ = "Asia/Kuala_Lumpur"
+DASHBOARD_EVENTS_LIMIT = int(os.getenv("DASHBOARD_EVENTS_LIMIT", "250"))
+
+# Static $project stage that formats dashboard rows server-side. start_time/end_time
+# are stored as BSON dates, so Mongo renders them without any per-event parsing;
+# events with start.date (or no start at all) are shown as all-day
+_DASHBOARD_EVENT_IS_TIMED = {"$and": [
+    {"$not": [{"$ifNull": ["$start.date", False]}]},
+    {"$ifNull": ["$start.dateTime", False]}
+]}
+DASHBOARD_EVENT_FORMAT_STAGE = {"$project": {
+    "_id": 0,
+    "title": {"$ifNull": ["$summary", "No Title"]},
+    "date": {"$dateToString": {
+        "format": "%d-%m-%Y", "date": "$start_time",
+        "timezone": DASHBOARD_EVENTS_TZ, "onNull": "Unknown"
+    }},
+    "time": {"$cond": [_DASHBOARD_EVENT_IS_TIMED, {"$concat": [
+        {"$dateToString": {"format": "%H:%M", "date": "$start_time", "timezone": DASHBOARD_EVENTS_TZ}},
+        " - ",
+        {"$dateToString": {"format": "%H:%M", "date": "$end_time", "timezone": DASHBOARD_EVENTS_TZ}}
+    ]}, "All-day"]}
+}}
+
+# WhatsApp Graph API endpoint and auth headers; the token is fixed for the process lifetime
+WHATSAPP_MESSAGES_URL = f"https://graph.facebook.com/v23.0/{PHONE_NUMBER_ID}/messages"
+WHATSAPP_HEADERS = {
+    "Authorization": f"Bearer {WHATSAPP_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+# Misconfiguration is fixed for the process lifetime, so decide it once; sends fail
+# fast with this result instead of building a payload for a request that can't work
+if not WHATSAPP_TOKEN:
+    WHATSAPP_CONFIG_ERROR = {"status": "error", "error": "Missing WHATSAPP_TOKEN in environment", "error_type": "missing_token_env"}
+elif not PHONE_NUMBER_ID:
+    WHATSAPP_CONFIG_ERROR = {"status": "error", "error": "Missing PHONE_NUMBER_ID in environment", "error_type": "missing_phone_number_id_env"}
+else:
+    WHATSAPP_CONFIG_ERROR = None
+
+# Recipients that never hit the Graph API: the admin playground sender is logged locally
+PLAYGROUND_RECIPIENT = "601234567890"
+WHATSAPP_LOCAL_RECIPIENTS = frozenset({PLAYGROUND_RECIPIENT})
+
+# Shared WhatsApp Graph API client so sends reuse pooled keep-alive connections
+WHATSAPP_MAX_CONNECTIONS = int(os.getenv("WHATSAPP_MAX_CONNECTIONS", "100"))
+WHATSAPP_MAX_KEEPALIVE = int(os.getenv("WHATSAPP_MAX_KEEPALIVE", "50"))
+# Connection-level retries only (connect errors/timeouts), so a POST is never sent twice
+WHATSAPP_CONNECT_RETRIES = int(os.getenv("WHATSAPP_CONNECT_RETRIES", "2"))
+# Response-level retries only where Graph did not process the request (throttled or
+# unavailable). 500/502/504 are left out: the upstream may already have delivered the
+# message, and without an idempotency key a retry could send it twice
+WHATSAPP_RETRY_STATUSES = frozenset({429, 503})
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "3"))
+WHATSAPP_RETRY_BASE_DELAY = 0.2  # seconds, doubled per attempt
+WHATSAPP_RETRY_MAX_DELAY = 2.0
+
+# HTTP/2 lets concurrent sends multiplex over a few connections (needs the h2 package)
+WHATSAPP_HTTP2 = os.getenv("WHATSAPP_HTTP2", "1") == "1"
+_wa_client = None
+# Separate phase bounds: Graph can be slow to answer, but connecting, writing a small
+# JSON body and waiting for a pooled connection should all be quick
+WHATSAPP_TIMEOUT = httpx.Timeout(connect=5.0, read=25.0, write=5.0, pool=5.0)
+
+# Process-wide upper bound on in-flight Graph API POSTs from every send path (queue
+# workers, Cloud Tasks handlers, direct sends). With HTTP/2 the connection limit alone
+# doesn't cap this; keeps bursts well inside Meta's per-number throughput limit
+WHATSAPP_SEND_CONCURRENCY = int(os.getenv("WHATSAPP_SEND_CONCURRENCY", "50"))
+_wa_send_semaphore = None
+
+# In-process send queue for fire-and-forget messages sent from request handlers;
+# workers are started/stopped from the FastAPI lifespan
+WHATSAPP_QUEUE_SIZE = int(os.getenv("WHATSAPP_QUEUE_SIZE", "1000"))
+WHATSAPP_QUEUE_WORKERS = int(os.getenv("WHATSAPP_QUEUE_WORKERS", "8"))
+WHATSAPP_QUEUE_DRAIN_TIMEOUT = 10  # seconds to flush pending sends on shutdown
+_wa_queue = None
+_wa_workers = []
+# Strong references to direct-send fallback tasks; the loop only holds weak ones,
+# so an untracked task could be garbage-collected before the message goes out
+_wa_direct_sends = set()
+
+# Verbose per-send payload/response dumps, off unless WHATSAPP_DEBUG=1
+WHATSAPP_DEBUG = os.getenv("WHATSAPP_DEBUG") == "1"
+
+def get_whatsapp_client() -> httpx.AsyncClient:
+    """Return the process-wide httpx client for the WhatsApp API, creating it on first use."""
+    global _wa_client
+    if _wa_client is None or _wa_client.is_closed:
+        # Limits go on the transport: httpx ignores client-level limits once a transport is given
+        transport = httpx.AsyncHTTPTransport(
+            http2=WHATSAPP_HTTP2,
+            retries=WHATSAPP_CONNECT_RETRIES,
+            limits=httpx.Limits(
+                max_connections=WHATSAPP_MAX_CONNECTIONS,
+                max_keepalive_connections=WHATSAPP_MAX_KEEPALIVE,
+                keepalive_expiry=60
+            )
+        )
+        _wa_client = httpx.AsyncClient(
+            timeout=WHATSAPP_TIMEOUT,
+            transport=transport
+        )
+    return _wa_client
+
+async def close_whatsapp_client():
+    """Close the shared WhatsApp client (called from the FastAPI lifespan on shutdown)."""
+    global _wa_client
+    if _wa_client is not None:
+        await _wa_client.aclose()
+        _wa_client = None
+
 def clean_unicode(text):
-    return text.encode("utf-8", errors="replace").decode("utf-8")
+    # Fast path: almost every string is already valid UTF-8 (no lone surrogates)
+    try:
+        text.encode("utf-8")
+        return text
+    except UnicodeEncodeError:
+        return text.encode("utf-8", errors="replace").decode("utf-8")
+
+_sha256 = hashlib.sha256
+
+def hash_data(data) -> str:
+    """Hash sensitive data (str or bytes) using SHA-256 (stored lookups depend on it; do not change)"""
+    return _sha256(data if isinstance(data, bytes) else data.encode()).hexdigest()
 
-def hash_data(data: str) -> str:
-    """Hash sensitive data using SHA-256"""
-    return hashlib.sha256(data.encode()).hexdigest()
+def cache_key(data: str) -> bytes:
+    """Short BLAKE2b digest for in-process cache keys; never persisted, so free to change"""
+    return hashlib.blake2b(data.encode(), digest_size=16).digest()
 
 def encrypt_phone(phone_number: str) -> str:
-    return fernet.encrypt(phone_number.encode()).decode()
+    # Fernet tokens are URL-safe base64, so ASCII decoding is exact
+    return fernet.encrypt(phone_number.encode("ascii")).decode("ascii")
 
-def decrypt_phone(encrypted_number: str) -> str:
-    return fernet.decrypt(encrypted_number.encode()).decode()
+def decrypt_phone(encrypted_number) -> str:
+    # Fernet accepts the stored str token directly; no need to re-encode it first
+    return fernet.decrypt(encrypted_number).decode("ascii")
 
-async def send_whatsapp_message(recipient_id: str, message: str):
-    
-    url = f"https://graph.facebook.com/v23.0/{PHONE_NUMBER_ID}/messages"
-    
-    current_token = WHATSAPP_TOKEN
-    
-    if not current_token:
-        error_msg = "Missing WHATSAPP_TOKEN in environment"
-        return {"status": "error", "error": error_msg, "error_type": "missing_token_env"}
-    
-    headers = {
-        "Authorization": f"Bearer {current_token}",
-        "Content-Type": "application/json"
+def decrypt_phones(encrypted_numbers: list) -> list:
+    """
+    Decrypt a batch of phone numbers with the shared Fernet instance.
+
+    Args:
+        encrypted_numbers: List of encrypted phone number strings
+
+    Returns:
+        List of decrypted numbers in the same order; entries that are missing
+        or fail to decrypt are returned as None
+    """
+    decrypt = fernet.decrypt
+    decrypted = []
+    for encrypted_number in encrypted_numbers:
+        try:
+            decrypted.append(decrypt(encrypted_number).decode("ascii"))
+        except (InvalidToken, TypeError):
+            decrypted.append(None)
+    return decrypted
+
+async def decrypt_phones_bulk(encrypted_numbers: list) -> list:
+    """
+    Decrypt a large batch of phone numbers off the event loop.
+
+    Args:
+        encrypted_numbers: List of encrypted phone number strings
+
+    Returns:
+        Same as decrypt_phones: decrypted numbers in order, None for bad entries
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, decrypt_phones, encrypted_numbers)
+
+async def _post_whatsapp(payload: dict, log_prefix: str = "[WHATSAPP_MESSAGE]") -> dict:
+    """
+    POST a message payload to the Graph API over the shared client.
+
+    Args:
+        payload: Complete Graph API message body
+        log_prefix: Tag used for the debug response log
+
+    Returns:
+        Result dict with status, status_code, response_json, and either
+        message_id on success or response_text on failure
+    """
+    global _wa_send_semaphore
+    if _wa_send_semaphore is None:
+        _wa_send_semaphore = asyncio.Semaphore(WHATSAPP_SEND_CONCURRENCY)
+
+    body = orjson.dumps(payload)
+    client = get_whatsapp_client()
+    for attempt in range(1, WHATSAPP_MAX_ATTEMPTS + 1):
+        try:
+            # Held only for the request itself, not for the retry backoff below
+            async with _wa_send_semaphore:
+                response = await client.post(WHATSAPP_MESSAGES_URL, content=body, headers=WHATSAPP_HEADERS)
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+
+        if response.status_code not in WHATSAPP_RETRY_STATUSES or attempt == WHATSAPP_MAX_ATTEMPTS:
+            break
+
+        # Exponential backoff with jitter; honour a numeric Retry-After within the cap
+        delay = min(WHATSAPP_RETRY_BASE_DELAY * (2 ** (attempt - 1)), WHATSAPP_RETRY_MAX_DELAY)
+        retry_after = response.headers.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            delay = min(max(delay, float(retry_after)), WHATSAPP_RETRY_MAX_DELAY)
+        delay += random.uniform(0, 0.1)
+        logger.info("%s Got %s, retrying in %.2fs (attempt %d/%d)",
+                    log_prefix, response.status_code, delay, attempt, WHATSAPP_MAX_ATTEMPTS)
+        await asyncio.sleep(delay)
+
+    logger.debug("%s Response status: %s", log_prefix, response.status_code)
+    if WHATSAPP_DEBUG:
+        logger.debug("%s Response body: %s", log_prefix, response.text)
+
+    response_json = None
+    try:
+        response_json = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        response_json = None
+
+    if response.status_code == 200:
+        return {
+            "status": "success",
+            "status_code": response.status_code,
+            "response_json": response_json,
+            "message_id": response_json.get("messages", [{}])[0].get("id") if response_json else None
+        }
+    return {
+        "status": "error",
+        "status_code": response.status_code,
+        "response_text": response.text[:500],
+        "response_json": response_json
     }
+
+async def send_whatsapp_message(recipient_id: str, message: str):
+    if WHATSAPP_CONFIG_ERROR:
+        return dict(WHATSAPP_CONFIG_ERROR)
+    if not recipient_id:
+        return {"status": "error", "error": "Missing recipient_id", "error_type": "missing_recipient"}
+
+    if recipient_id in WHATSAPP_LOCAL_RECIPIENTS:
+        logger.info("[WHATSAPP_MESSAGE] Sending to admin: %s", message)
+        return {"status": "success", "message": message}
+
     data = {
         "messaging_product": "whatsapp",
         "to": recipient_id,
         "type": "text",
         "text": {"body": message}
     }
+    return await _post_whatsapp(data)
 
-    if recipient_id == "601234567890":
-        print(f"[WHATSAPP_MESSAGE] Sending to admin: {message}")
-        return {"status": "success", "message": message}
-    else: 
+async def _whatsapp_queue_worker():
+    """Send queued messages one at a time; WHATSAPP_QUEUE_WORKERS of these run concurrently."""
+    while True:
+        recipient_id, message, future = await _wa_queue.get()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=data, headers=headers)
-                
-                response_text = response.text
-                
-                response_json = None
-                try:
-                    response_json = response.json()
-                    
-                except Exception as json_error:
-                    response_json = None
-                
-                if response.status_code == 401:
-                    return {"status": "error", "status_code": 401, "response_text": response_text[:500], "response_json": response_json}
-                
-                # Return a result object for the scheduler
-                if response.status_code == 200:
-                    result = {
-                        "status": "success", 
-                        "status_code": response.status_code, 
-                        "response_json": response_json,
-                        "message_id": response_json.get("messages", [{}])[0].get("id") if response_json else None
-                    }
-                    return result
-                else:
-                    result = {"status": "error", "status_code": response.status_code, "response_text": response_text[:500], "response_json": response_json}
-                    return result
+            result = await send_whatsapp_message(recipient_id, message)
+            if result.get("status") != "success":
+                logger.error("[WHATSAPP_QUEUE] Send to %s failed: %s", recipient_id, result)
+            if not future.done():
+                future.set_result(result)
         except Exception as e:
-            return {"status": "error", "error": str(e)}
+            logger.exception("[WHATSAPP_QUEUE] Send to %s raised: %s", recipient_id, e)
+            if not future.done():
+                future.set_result({"status": "error", "error": str(e)})
+        finally:
+            _wa_queue.task_done()
+
+async def start_whatsapp_queue():
+    """Create the send queue and its workers on the running loop (FastAPI lifespan startup)."""
+    global _wa_queue
+    if _wa_queue is not None:
+        return
+    _wa_queue = asyncio.Queue(maxsize=WHATSAPP_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    _wa_workers.extend(loop.create_task(_whatsapp_queue_worker()) for _ in range(WHATSAPP_QUEUE_WORKERS))
+
+async def stop_whatsapp_queue():
+    """Flush pending sends (bounded by WHATSAPP_QUEUE_DRAIN_TIMEOUT) and stop the workers."""
+    global _wa_queue
+    if _wa_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_wa_queue.join(), timeout=WHATSAPP_QUEUE_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("[WHATSAPP_QUEUE] %d sends still pending at shutdown", _wa_queue.qsize())
+    for worker in _wa_workers:
+        worker.cancel()
+    await asyncio.gather(*_wa_workers, return_exceptions=True)
+    _wa_workers.clear()
+    _wa_queue = None
+
+def enqueue_whatsapp_message(recipient_id: str, message: str) -> asyncio.Future:
+    """
+    Queue a WhatsApp text message without waiting for the Graph API round trip.
+
+    Must be called from the event loop. Falls back to sending in a task of its own
+    when the queue hasn't been started (scripts) or is full.
+
+    Args:
+        recipient_id: Recipient phone number
+        message: Message text
+
+    Returns:
+        Future resolving to the send_whatsapp_message result, for callers that want it
+    """
+    loop = asyncio.get_running_loop()
+    if _wa_queue is not None:
+        future = loop.create_future()
+        try:
+            _wa_queue.put_nowait((recipient_id, message, future))
+            return future
+        except asyncio.QueueFull:
+            logger.warning("[WHATSAPP_QUEUE] Queue full, sending to %s directly", recipient_id)
+    task = loop.create_task(send_whatsapp_message(recipient_id, message))
+    _wa_direct_sends.add(task)
+    task.add_done_callback(_wa_direct_sends.discard)
+    return task
 
 async def send_whatsapp_template(recipient_id: str, template_name: str, language_code: str = "en"):
     """
     Send a WhatsApp template message (for users outside 24-hour window).
     Template must be pre-approved in Meta Business Manager.
     """
-    url = f"https://graph.facebook.com/v23.0/{PHONE_NUMBER_ID}/messages"
-    
-    current_token = WHATSAPP_TOKEN
-    
-    if not current_token:
-        error_msg = "Missing WHATSAPP_TOKEN in environment"
-        return {"status": "error", "error": error_msg, "error_type": "missing_token_env"}
-    
-    headers = {
-        "Authorization": f"Bearer {current_token}",
-        "Content-Type": "application/json"
-    }
-    
+    if WHATSAPP_CONFIG_ERROR:
+        return dict(WHATSAPP_CONFIG_ERROR)
+    if not recipient_id:
+        return {"status": "error", "error": "Missing recipient_id", "error_type": "missing_recipient"}
+
     data = {
         "messaging_product": "whatsapp",
         "to": recipient_id,
@@ -132,127 +401,101 @@ async def send_whatsapp_template(recipient_id: str, template_name: str, language
             }
         }
     }
-    
-    print(f"[WHATSAPP_TEMPLATE] Sending to: {recipient_id}")
-    print(f"[WHATSAPP_TEMPLATE] Template: {template_name}, Language: {language_code}")
-    print(f"[WHATSAPP_TEMPLATE] Full payload: {json.dumps(data, indent=2)}")
-    print(f"[WHATSAPP_TEMPLATE] URL: {url}")
-    
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=data, headers=headers)
-            
-            print(f"[WHATSAPP_TEMPLATE] Response status: {response.status_code}")
-            print(f"[WHATSAPP_TEMPLATE] Response body: {response.text}")
-            
-            response_text = response.text
-            response_json = None
-            
-            try:
-                response_json = response.json()
-            except Exception as json_error:
-                response_json = None
-            
-            if response.status_code == 200:
-                result = {
-                    "status": "success", 
-                    "status_code": response.status_code, 
-                    "response_json": response_json,
-                    "message_id": response_json.get("messages", [{}])[0].get("id") if response_json else None
-                }
-                return result
-            else:
-                result = {
-                    "status": "error", 
-                    "status_code": response.status_code, 
-                    "response_text": response_text[:500], 
-                    "response_json": response_json
-                }
-                return result
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
 
-async def get_auth_url(user_id):
-    print("Entered get_auth_url")
-    # Create flow in executor since it's blocking
-    loop = asyncio.get_running_loop()
-    flow = await loop.run_in_executor(None, 
-        lambda: Flow.from_client_secrets_file(
-            "credentials.json",
-            scopes=SCOPES,
-            redirect_uri=redirect_uri
-        )
-    )
+    logger.info("[WHATSAPP_TEMPLATE] Sending to: %s", recipient_id)
+    logger.info("[WHATSAPP_TEMPLATE] Template: %s, Language: %s", template_name, language_code)
+    if WHATSAPP_DEBUG:
+        logger.debug("[WHATSAPP_TEMPLATE] Full payload: %s", orjson.dumps(data, option=orjson.OPT_INDENT_2).decode())
+        logger.debug("[WHATSAPP_TEMPLATE] URL: %s", WHATSAPP_MESSAGES_URL)
 
-    # Get auth URL in executor since it makes HTTP requests
-    auth_url, state = await loop.run_in_executor(None,
-        lambda: flow.authorization_url(
-            prompt='consent',
-            access_type='offline',
-            include_granted_scopes='true'
-        )
+    return await _post_whatsapp(data, log_prefix="[WHATSAPP_TEMPLATE]")
+
+@lru_cache(maxsize=1)
+def google_client_config() -> dict:
+    """Return the OAuth client secrets from credentials.json, read from disk once per process."""
+    with open("credentials.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _build_auth_url():
+    """
+    Build a Google consent URL from the cached client config.
+
+    Flow construction and authorization_url() are in-memory string work with no
+    I/O, so this runs inline on the event loop.
+
+    Returns:
+        Tuple of (auth_url, state)
+    """
+    flow = Flow.from_client_config(
+        google_client_config(),
+        scopes=SCOPES,
+        redirect_uri=redirect_uri
+    )
+    return flow.authorization_url(
+        prompt='consent',
+        access_type='offline',
+        include_granted_scopes='true'
     )
 
+async def get_auth_url(user_id):
+    logger.debug("Entered get_auth_url")
+    # Reuse a recently issued URL so repeated prompts skip the flow setup and state write,
+    # but only while its state is still the one stored for this user
+    cached = auth_url_cache.get(user_id)
+    if cached:
+        cached_url, cached_state = cached
+        if await oauth_states_collection.find_one(
+            {"user_id": user_id, "state": cached_state}, {"_id": 1}
+        ):
+            return cached_url
+        auth_url_cache.pop(user_id, None)
+
+    auth_url, state = _build_auth_url()
+
     # Update MongoDB asynchronously
     await oauth_states_collection.update_one(
         {"user_id": user_id},
         {
             "$set": {
                 "state": state,
-                "created_at": datetime.now()
+                "created_at": datetime.now(timezone.utc)
             }
         },
         upsert=True
     )
 
+    auth_url_cache[user_id] = (auth_url, state)
     return auth_url
 
-# Background asyncio event loop managed in its own thread
-# Expose a getter to safely retrieve it at runtime
-event_loop = None
-event_loop_ready = threading.Event()
-
-def _run_bg_loop():
-    global event_loop
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    event_loop = loop
-    event_loop_ready.set()
-    loop.run_forever()
-
-threading.Thread(target=_run_bg_loop, daemon=True).start()
-
-def get_event_loop():
-    if event_loop is None:
-        # Wait briefly for the background loop to initialize
-        event_loop_ready.wait(timeout=5)
-    return event_loop
-
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    print("Authorization header received")
+    logger.debug("Authorization header received")
 
     token = credentials.credentials
-    print(f"Token starts with: {token[:10]}... (length: {len(token)})")
+    logger.debug("Token starts with: %s... (length: %d)", token[:10], len(token))
+
+    # Tokens are replayed on every dashboard call; reuse the verified payload until near expiry
+    token_key = cache_key(token)
+    cached_payload = jwt_payload_cache.get(token_key)
+    if cached_payload is not None and cached_payload.get("exp", 0) > time.time() + JWT_EXPIRY_LEEWAY:
+        return dict(cached_payload)
 
     try:
-        # Run JWT decode in executor since it's CPU-bound
-        loop = asyncio.get_running_loop()
-        payload = await loop.run_in_executor(None,
-            lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        )
-        print(f"Decoded JWT payload: {payload}")
-    except jwt.ExpiredSignatureError:
-        print("JWT token has expired")
+        # HS256 verify is a single HMAC; offloading it to a thread costs more than it saves
+        payload = jwt.decode(token, JWT_DECODE_KEY, algorithms=[ALGORITHM])
+        logger.debug("Decoded JWT payload: %s", payload)
+    except ExpiredSignatureError:
+        logger.info("JWT token has expired")
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError as e:
-        print(f"Invalid JWT token: {e}")
+    except InvalidTokenError as e:
+        logger.info("Invalid JWT token: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token")
 
     if "user_id" not in payload:
-        print("Decoded JWT payload missing 'user_id'")
+        logger.info("Decoded JWT payload missing 'user_id'")
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
-    return payload
+    jwt_payload_cache[token_key] = payload
+    return dict(payload)
 
 async def get_dashboard_events(user_id: str):
     """
@@ -265,55 +508,23 @@ async def get_dashboard_events(user_id: str):
     calendar_collection = db["calendar"]
 
     try:
-        tz = pytz.timezone("Asia/Kuala_Lumpur")
-        now = datetime.now(tz)
+        today = datetime.now(KL_TZ).date()
 
         # Start from today at midnight
-        start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Fetch all upcoming events (no upper limit)
-        cursor = calendar_collection.find({
-            "user_id": user_id,
-            "start_time": {"$gte": start_time}
-        }).sort("start_time", 1)
-        
-        events = []
-        async for event in cursor:
-            events.append(event)
-
-        formatted_events = []
-
-        for event in events:
-            title = event.get("summary", "No Title")
-            start = event.get("start", {})
-            end = event.get("end", {})
-
-            start_dt_str = start.get("dateTime")
-            end_dt_str = end.get("dateTime")
-            start_date_str = start.get("date")
-            end_date_str = end.get("date")
-
-            if start_date_str:
-                event_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-                formatted_date = event_date.strftime("%d-%m-%Y")
-                formatted_time = "All-day"
-            elif start_dt_str:
-                start_dt = dateparser.parse(start_dt_str).astimezone(tz)
-                end_dt = dateparser.parse(end_dt_str).astimezone(tz)
-                formatted_date = start_dt.strftime("%d-%m-%Y")
-                formatted_time = f"{start_dt.strftime('%H:%M')} - {end_dt.strftime('%H:%M')}"
-            else:
-                formatted_date = "Unknown"
-                formatted_time = "All-day"
-
-            formatted_events.append({
-                "title": title,
-                "date": formatted_date,
-                "time": formatted_time
-            })
+        start_time = datetime.combine(today, dt_time.min, tzinfo=KL_TZ)
+
+        pipeline = [
+            {"$match": {"user_id": user_id, "start_time": {"$gte": start_time}}},
+            {"$sort": {"start_time": 1}},
+            {"$limit": DASHBOARD_EVENTS_LIMIT},
+            DASHBOARD_EVENT_FORMAT_STAGE
+        ]
+
+        cursor = await calendar_collection.aggregate(pipeline)
+        formatted_events = await cursor.to_list(length=None)
 
         return {"events": formatted_events}
 
     except Exception as e:
-        print(f"Error fetching dashboard events: {e}")
+        logger.error("Error fetching dashboard events: %s", e)
         return {"events": [], "error": str(e)}
\ No newline at end of file